@@ -5,701 +5,174 @@ import json
 import re
 import html as html_lib
 from datetime import datetime, timedelta, date
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit.components.v1 as components
 from data_loader import load_all_data
-from rag_engine import RAGEngine
 from query_engine import QueryEngine
-from briefing import generate_briefing
-import base64, pathlib
+import base64, logging, os, pathlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import MappingProxyType
+# Dossier des caches persist="disk" de Streamlit (~/.streamlit/cache).
+from streamlit.runtime.caching.storage.local_disk_cache_storage import get_cache_folder_path
+
+
+APP_DIR = pathlib.Path(__file__).parent
+
+# Copy-on-Write (toujours actif dès pandas 3) : un .copy() ou .assign() ne duplique
+# réellement que les colonnes modifiées.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 
 # ─── LOGO LOADER ──────────────────────────────────────────────────────────────
+_MIME_MAP = MappingProxyType({
+    ".svg": "image/svg+xml",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+})
+
+
+# cache_resource : la chaîne (immuable) est partagée telle quelle, sans copie pickle à chaque lecture.
+@st.cache_resource(show_spinner=False)
 def _image_data_uri(*filenames: str) -> str | None:
-    """Retourne un data URI pour la première image locale trouvée."""
-    base = pathlib.Path(__file__).parent
-    mime_map = {
-        ".svg": "image/svg+xml",
-        ".png": "image/png",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".webp": "image/webp",
-    }
+    """Retourne un data URI pour la première image locale trouvée (encodé une fois par processus)."""
     for filename in filenames:
-        path = base / filename
+        path = APP_DIR / filename
         if path.exists() and path.is_file():
-            mime = mime_map.get(path.suffix.lower(), "application/octet-stream")
+            mime = _MIME_MAP.get(path.suffix.lower(), "application/octet-stream")
             return f"data:{mime};base64,{base64.b64encode(path.read_bytes()).decode()}"
     return None
 
 # ─── PAGE CONFIG ──────────────────────────────────────────────────────────────
+# Premier appel Streamlit du script, une seule fois par rerun ; icône en chemin absolu
+# pour ne pas dépendre du répertoire de lancement.
 st.set_page_config(
     page_title="Mobility Copilot · Montréal",
-    page_icon="logo.svg",
+    page_icon=str(APP_DIR / "logo.svg"),
     layout="wide",
     initial_sidebar_state="expanded"
 )
 
-# ─── UI THEME STATE ──────────────────────────────────────────────────────────
-if "ui_theme" not in st.session_state:
-    st.session_state.ui_theme = "Clair"
-if st.session_state.ui_theme not in {"Clair", "Sombre"}:
-    st.session_state.ui_theme = "Clair"
-if "theme_dark_toggle" not in st.session_state:
-    st.session_state.theme_dark_toggle = st.session_state.ui_theme == "Sombre"
-st.session_state.ui_theme = "Sombre" if st.session_state.get("theme_dark_toggle", False) else "Clair"
-
+# ─── SESSION STATE ───────────────────────────────────────────────────────────
 PAGE_OPTIONS = ["Chat analytique", "Briefing", "Dashboard"]
-if "current_page" not in st.session_state:
-    st.session_state.current_page = "Chat analytique"
-if st.session_state.current_page not in PAGE_OPTIONS:
+_PAGE_SET = frozenset(PAGE_OPTIONS)
+CHAT_HISTORY_VISIBLE = 20  # messages rendus à chaque rerun, les plus anciens sur demande
+CHAT_HISTORY_MAX = 40  # au-delà, les plus anciens messages sont résumés en une seule ligne
+_SESSION_DEFAULTS = {
+    "ui_theme": "Clair",
+    "theme_dark_toggle": False,
+    "current_page": "Chat analytique",
+    "chat_history": [],
+    "pending_question": None,
+    "pending_ambiguity": None,
+    "user_bubble_cache": {},
+    "briefing_render": None,
+}
+for _key, _default in _SESSION_DEFAULTS.items():
+    # Copie des valeurs mutables pour ne jamais partager une liste ou un dict entre sessions.
+    st.session_state.setdefault(_key, _default.copy() if isinstance(_default, (list, dict)) else _default)
+
+st.session_state.ui_theme = "Sombre" if st.session_state.theme_dark_toggle else "Clair"
+if st.session_state.current_page not in _PAGE_SET:
     st.session_state.current_page = "Chat analytique"
 # Synchronise dès le début du run pour éviter tout décalage header/contenu.
-if st.session_state.get("sidebar_page") in PAGE_OPTIONS:
+if st.session_state.get("sidebar_page") in _PAGE_SET:
     st.session_state.current_page = st.session_state["sidebar_page"]
 
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-if "pending_question" not in st.session_state:
-    st.session_state.pending_question = None
-if "pending_ambiguity" not in st.session_state:
-    st.session_state.pending_ambiguity = None
-
 
 def _reset_chat_state() -> None:
     st.session_state.chat_history = []
     st.session_state.pending_question = None
     st.session_state.pending_ambiguity = None
+    st.session_state.user_bubble_cache = {}
     if "amb_choice_idx" in st.session_state:
         del st.session_state["amb_choice_idx"]
 
 
-# ─── PREMIUM MINIMAL CSS ─────────────────────────────────────────────────────
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Geist:wght@300;400;500;600&family=Geist+Mono:wght@400;500&display=swap');
-
-/* ── Reset & base ── */
-*, *::before, *::after { box-sizing: border-box; margin: 0; }
-
-:root {
-    --white:      #ffffff;
-    --bg:         #f4f9ff;
-    --bg-subtle:  #ebf3fe;
-    --border:     #d4e2f4;
-    --border-mid: #b8cfe8;
-    --text:       #16324f;
-    --text-2:     #2a4f77;
-    --text-3:     #6f8faf;
-    --accent:     #6ea3d4;
-    --accent-strong: #4f86b9;
-    --accent-dim: #6ea3d41f;
-    --green:      #16a34a;
-    --orange:     #ea580c;
-    --red:        #dc2626;
-    --radius:     10px;
-    --font:       'Geist', -apple-system, sans-serif;
-    --font-mono:  'Geist Mono', 'SF Mono', monospace;
-
-    --mc-card-bg: var(--white);
-    --mc-surface: var(--bg-subtle);
-    --mc-border: var(--border);
-    --mc-text: var(--text);
-    --mc-text-muted: var(--text-2);
-    --mc-text-subtle: var(--text-3);
-    --mc-accent: var(--accent);
-    --mc-accent-strong: var(--accent-strong);
-    --mc-warn-bg: #fff7ed;
-    --mc-warn-border: #fed7aa;
-    --mc-warn: var(--orange);
-    --mc-warn-soft: #ea580c33;
-    --mc-danger: var(--red);
-    --mc-success: var(--green);
-    --mc-input-bg-start: var(--white);
-    --mc-input-bg-end: var(--bg-subtle);
-    --mc-input-border: var(--border-mid);
-    --mc-input-border-hover: var(--accent-strong);
-    --mc-chat-field-bg: var(--mc-card-bg);
-}
-
-html, body, [class*="css"], .main, .block-container {
-    background: var(--bg) !important;
-    color: var(--text) !important;
-    font-family: var(--font) !important;
-    font-size: 14px !important;
-    line-height: 1.6 !important;
-    -webkit-font-smoothing: antialiased !important;
-}
-
-/* ── Hide Streamlit chrome ── */
-#MainMenu, footer, .stDeployButton,
-[data-testid="stToolbar"], [data-testid="stDecoration"] {
-    display: none !important;
-}
-
-/* Conserve un header technique minimal pour garder le contrôle de sidebar */
-[data-testid="stHeader"] {
-    background: transparent !important;
-    height: 2.6rem !important;
-    min-height: 2.6rem !important;
-    border: none !important;
-    position: sticky !important;
-    top: 0 !important;
-    z-index: 1001 !important;
-}
-
-/* Boutons sidebar robustes (Windows/macOS): laisser le contrôle natif cliquable */
-[data-testid="stSidebarCollapseButton"],
-[data-testid="collapsedControl"],
-[data-testid="stSidebarCollapsedControl"] {
-    z-index: 1100 !important;
-}
-
-[data-testid="stSidebarCollapseButton"] button,
-[data-testid="collapsedControl"] button,
-[data-testid="stSidebarCollapsedControl"] button {
-    position: relative !important;
-    background: color-mix(in srgb, var(--mc-surface) 88%, transparent) !important;
-    border: 1px solid color-mix(in srgb, var(--mc-border) 90%, transparent) !important;
-    box-shadow: 0 4px 14px rgba(0, 0, 0, 0.12) !important;
-    padding: 0 !important;
-    margin: 0 !important;
-    color: transparent !important;
-    font-size: 0 !important;
-}
-[data-testid="stSidebarCollapseButton"] button:hover,
-[data-testid="collapsedControl"] button:hover,
-[data-testid="stSidebarCollapsedControl"] button:hover {
-    border-color: var(--mc-accent-strong) !important;
-    background: color-mix(in srgb, var(--mc-surface) 72%, var(--mc-card-bg) 28%) !important;
-}
-
-/* Sidebar ouverte: bouton discret intégré */
-[data-testid="stSidebarCollapseButton"] button {
-    border-radius: 8px !important;
-    width: 28px !important;
-    min-width: 28px !important;
-    height: 28px !important;
-    min-height: 28px !important;
-}
-
-
-[data-testid="collapsedControl"] button,
-[data-testid="stSidebarCollapsedControl"] button {
-    border-left: none !important;
-    border-radius: 0 12px 12px 0 !important;
-    width: 30px !important;
-    min-width: 30px !important;
-    height: 44px !important;
-    min-height: 44px !important;
-}
-
-/* On masque seulement le texte ligature, sans supprimer le bouton (évite le bug Windows) */
-[data-testid="stSidebarCollapseButton"] button > *,
-[data-testid="collapsedControl"] button > *,
-[data-testid="stSidebarCollapsedControl"] button > * {
-    opacity: 0 !important;
-    pointer-events: none !important;
-}
-
-/* Flèche fallback stable si l'icône native ne s'affiche pas */
-[data-testid="stSidebarCollapseButton"] button::after,
-[data-testid="collapsedControl"] button::after,
-[data-testid="stSidebarCollapsedControl"] button::after {
-    position: absolute !important;
-    inset: 0 !important;
-    display: grid !important;
-    place-items: center !important;
-    font-family: var(--font) !important;
-    font-size: 21px !important;
-    font-weight: 500 !important;
-    line-height: 1 !important;
-    color: var(--mc-text-muted) !important;
-}
-[data-testid="stSidebarCollapseButton"] button::after { content: "‹"; }
-[data-testid="collapsedControl"] button::after,
-[data-testid="stSidebarCollapsedControl"] button::after { content: "›"; }
-
-/* Fallback réouverture sidebar (affiché uniquement si contrôle natif absent) */
-.mc-sidebar-fallback-reopen {
-    position: fixed !important;
-    left: 0 !important;
-    top: 82px !important;
-    width: 30px !important;
-    min-width: 30px !important;
-    height: 44px !important;
-    min-height: 44px !important;
-    display: none !important;
-    place-items: center !important;
-    border-left: none !important;
-    border-radius: 0 12px 12px 0 !important;
-    border: 1px solid color-mix(in srgb, var(--mc-border) 90%, transparent) !important;
-    background: color-mix(in srgb, var(--mc-surface) 88%, transparent) !important;
-    box-shadow: 0 4px 14px rgba(0, 0, 0, 0.12) !important;
-    color: var(--mc-text-muted) !important;
-    font-family: var(--font) !important;
-    font-size: 21px !important;
-    line-height: 1 !important;
-    z-index: 1300 !important;
-    cursor: pointer !important;
-}
-.mc-sidebar-fallback-reopen:hover {
-    border-color: var(--mc-accent-strong) !important;
-    background: color-mix(in srgb, var(--mc-surface) 72%, var(--mc-card-bg) 28%) !important;
-}
-
-/* ── Main padding ── */
-.block-container {
-    padding: 2rem 2.5rem 4rem !important;
-    max-width: 1200px !important;
-    padding-bottom: 9rem !important;
-}
-
-/* ── Sidebar ── */
-section[data-testid="stSidebar"] {
-    background: linear-gradient(180deg, var(--bg-subtle) 0%, var(--bg) 100%) !important;
-    border-right: 1px solid var(--border) !important;
-    padding-top: 1rem !important;
-}
-section[data-testid="stSidebar"] > div {
-    padding: 0 0.9rem !important;
-    display: flex !important;
-    flex-direction: column !important;
-    height: 100% !important;
-}
-section[data-testid="stSidebar"] * {
-    color: var(--text) !important;
-    font-family: var(--font) !important;
-}
-[data-testid="stSidebarNav"] { display: none; }
-.sidebar-bottom { margin-top: auto !important; padding-top: 18px !important; }
-section[data-testid="stSidebar"] [data-baseweb="select"] > div {
-    min-height: 36px !important;
-    padding-top: 0 !important;
-    padding-bottom: 0 !important;
-}
-@media (max-height: 920px) {
-    .sidebar-bottom { margin-top: 10px !important; padding-top: 10px !important; }
-}
+def _summarize_old(history: list[dict]) -> list[dict]:
+    """Remplace les messages au-delà de CHAT_HISTORY_MAX par une entrée de résumé unique."""
+    summary = history[0] if history and history[0].get("role") == "system" else None
+    messages = history[1:] if summary else history
+    keep = CHAT_HISTORY_MAX - 1
+    if len(messages) <= keep:
+        return history
+    dropped = (summary or {}).get("dropped", 0) + len(messages) - keep
+    return [
+        {"role": "system", "content": f"[résumé : {dropped} messages antérieurs]", "dropped": dropped},
+        *messages[-keep:],
+    ]
 
-/* ── Sidebar nav (radio -> pills fluides) ── */
-section[data-testid="stSidebar"] [data-testid="stRadio"] > div[role="radiogroup"] {
-    gap: 4px !important;
-}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label {
-    background: transparent !important;
-    border: 1px solid transparent !important;
-    border-radius: 10px !important;
-    padding: 6px 8px !important;
-    margin: 0 !important;
-    transition: background 180ms ease, border-color 180ms ease, transform 180ms ease, box-shadow 180ms ease !important;
-}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label:hover {
-    background: var(--mc-surface) !important;
-    border-color: var(--border-mid) !important;
-    transform: translateX(2px) !important;
-    box-shadow: 0 2px 8px rgba(79, 134, 185, 0.14) !important;
-}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label:has(input:checked) {
-    background: linear-gradient(180deg, var(--mc-card-bg) 0%, var(--mc-surface) 100%) !important;
-    border-color: var(--accent) !important;
-    transform: translateX(2px) !important;
-    box-shadow: 0 3px 10px rgba(79, 134, 185, 0.2) !important;
-}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label > div:first-child {
-    display: none !important;
-}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label > div:last-child {
-    padding-left: 0 !important;
-}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label > div:last-child p {
-    font-family: var(--font) !important;
-    font-size: 13px !important;
-    line-height: 1.35 !important;
-    font-weight: 500 !important;
-    color: var(--text) !important;
-    letter-spacing: 0 !important;
-}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label:has(input:checked) > div:last-child p {
-    color: var(--accent-strong) !important;
-    font-weight: 600 !important;
-}
 
-/* ── Tabs ── */
-.stTabs [data-baseweb="tab-list"] {
-    background: transparent !important;
-    border-bottom: 1px solid var(--border) !important;
-    border-radius: 0 !important;
-    padding: 0 !important;
-    gap: 0 !important;
-}
-.stTabs [data-baseweb="tab"] {
-    background: transparent !important;
-    color: var(--text-3) !important;
-    font-family: var(--font) !important;
-    font-size: 13px !important;
-    font-weight: 500 !important;
-    border-radius: 0 !important;
-    padding: 10px 18px !important;
-    border-bottom: 2px solid transparent !important;
-    margin-bottom: -1px !important;
-    transition: color 0.15s !important;
-}
-.stTabs [aria-selected="true"] {
-    color: var(--accent-strong) !important;
-    border-bottom: 2px solid var(--accent-strong) !important;
-    background: transparent !important;
-    font-weight: 600 !important;
-}
-.stTabs [data-baseweb="tab"]:hover { color: var(--text-2) !important; }
-
-/* ── Chat messages ── */
-.stChatMessage {
-    background: var(--mc-card-bg) !important;
-    border: 1px solid var(--border) !important;
-    border-radius: 10px !important;
-    box-shadow: none !important;
-    padding: 10px 12px !important;
-    margin: 0 0 8px 0 !important;
-}
-[data-testid="chatAvatarIcon-user"],
-[data-testid="chatAvatarIcon-assistant"] {
-    display: none !important;
-}
-[data-testid="stChatMessageAvatar"] { display: none !important; }
+# Marqueur des cartes d'ambiguïté renvoyées par le moteur : testé une fois, à l'insertion.
+AMBIGUITY_CARD_MARKER = "DÉTECTION D'AMBIGUÏTÉ"
 
-.chat-user-row {
-    margin: 0 0 10px 0;
-}
-.chat-user-bubble {
-    border: 1px solid var(--accent-strong);
-    border-radius: 10px;
-    background: var(--mc-card-bg);
-    color: var(--text);
-    font-family: var(--font);
-    font-size: 14px;
-    line-height: 1.45;
-    padding: 11px 14px;
-}
 
-/* ── Chat input ── */
-[data-testid="stChatInput"] {
-    --mc-sidebar-width: 340px;
-    position: fixed !important;
-    left: calc(50% + (var(--mc-sidebar-width) / 2)) !important;
-    transform: translateX(-50%) !important;
-    width: min(940px, calc(100vw - var(--mc-sidebar-width) - 2.8rem)) !important;
-    bottom: 26px !important;
-    z-index: 1000 !important;
-    margin: 0 !important;
-    padding: 0 !important;
-    overflow: hidden !important;
-    backdrop-filter: blur(8px) !important;
-    -webkit-backdrop-filter: blur(8px) !important;
-    background: linear-gradient(180deg, var(--mc-input-bg-start) 0%, var(--mc-input-bg-end) 100%) !important;
-    border: 1px solid var(--accent) !important;
-    border-radius: 22px !important;
-    box-shadow: 0 12px 32px rgba(79, 134, 185, 0.22), 0 2px 8px rgba(79, 134, 185, 0.14), inset 0 0 0 1px rgba(79, 134, 185, 0.09) !important;
-    transition: box-shadow 0.2s ease, border-color 0.2s ease !important;
-    top: auto !important;
-}
-[data-testid="stChatInput"] > div {
-    border: none !important;
-    border-radius: 0 !important;
-    background: var(--mc-chat-field-bg) !important;
-    box-shadow: none !important;
-    padding: 8px 10px !important;
-}
-[data-testid="stChatInput"] [data-baseweb="input"],
-[data-testid="stChatInput"] [data-baseweb="textarea"],
-[data-testid="stChatInput"] [data-baseweb="input"] > div,
-[data-testid="stChatInput"] [data-baseweb="textarea"] > div {
-    background: var(--mc-chat-field-bg) !important;
-    border: none !important;
-    box-shadow: none !important;
-}
-[data-testid="stChatInput"] input,
-[data-testid="stChatInput"] textarea,
-[data-testid="stChatInput"] [data-baseweb="input"] > div,
-[data-testid="stChatInput"] [data-baseweb="textarea"] > div {
-    background: transparent !important;
-    color: var(--mc-text) !important;
-    border: none !important;
-}
-[data-testid="stChatInput"] input::placeholder,
-[data-testid="stChatInput"] textarea::placeholder {
-    color: var(--mc-text-subtle) !important;
-    opacity: 1 !important;
-}
-[data-testid="stBottom"],
-[data-testid="stBottom"] > div,
-.stChatFloatingInputContainer,
-div:has(> [data-testid="stChatInput"]) {
-    background: transparent !important;
-}
-[data-testid="stChatInput"] [data-baseweb="input"] > div,
-[data-testid="stChatInput"] [data-baseweb="textarea"] > div,
-[data-testid="stChatInput"] [data-baseweb="input"] input,
-[data-testid="stChatInput"] [data-baseweb="textarea"] textarea {
-    background: transparent !important;
-    color: var(--mc-text) !important;
-}
+def _append_chat_message(role: str, content: str) -> None:
+    """Ajoute un message à l'historique en le gardant borné."""
+    history = st.session_state.chat_history
+    message = {"role": role, "content": content}
+    if role == "assistant" and AMBIGUITY_CARD_MARKER in content:
+        message["kind"] = "ambiguity"
+    history.append(message)
+    if len(history) > CHAT_HISTORY_MAX:
+        st.session_state.chat_history = _summarize_old(history)
+        # Les bulles des messages résumés ne seront plus rendues.
+        st.session_state.user_bubble_cache = {}
 
-/* ── Theme toggle visibility ── */
-[data-testid="stToggle"] {
-    display: flex !important;
-    justify-content: flex-end !important;
-}
-[data-testid="stToggle"] label[data-baseweb="checkbox"] > div {
-    background: color-mix(in srgb, var(--mc-surface) 78%, var(--mc-border) 22%) !important;
-    border: 1px solid var(--mc-border) !important;
-    box-shadow: inset 0 0 0 1px color-mix(in srgb, var(--mc-border) 70%, transparent) !important;
-}
-[data-testid="stToggle"] label[data-baseweb="checkbox"] input:checked + div {
-    background: var(--mc-accent) !important;
-    border-color: var(--mc-accent) !important;
-}
-[data-testid="stToggle"] label[data-baseweb="checkbox"] input + div > div {
-    background: #ffffff !important;
-    box-shadow: 0 1px 4px rgba(0,0,0,0.28) !important;
-}
-[data-testid="stChatInput"]:hover {
-    border-color: var(--accent-strong) !important;
-    box-shadow: 0 14px 36px rgba(79, 134, 185, 0.27), 0 3px 10px rgba(79, 134, 185, 0.16), inset 0 0 0 1px rgba(79, 134, 185, 0.13) !important;
-}
-[data-testid="stChatInput"]:focus-within {
-    border-color: var(--accent-strong) !important;
-    box-shadow: 0 0 0 2px rgba(110, 163, 212, 0.3), 0 14px 36px rgba(79, 134, 185, 0.27), inset 0 0 0 1px rgba(79, 134, 185, 0.15) !important;
-}
-[data-testid="stChatInput"] textarea {
-    font-family: var(--font) !important;
-    font-size: 14px !important;
-    color: var(--text) !important;
-    line-height: 1.45 !important;
-    background: transparent !important;
-    border: none !important;
-    box-shadow: none !important;
-    padding: 10px 8px !important;
-}
-[data-testid="stChatInput"] textarea::placeholder {
-    color: var(--text-3) !important;
-}
-[data-testid="stChatInput"] button {
-    width: 36px !important;
-    height: 36px !important;
-    min-width: 36px !important;
-    border-radius: 999px !important;
-    border: none !important;
-    background: var(--accent-strong) !important;
-    color: #ffffff !important;
-    box-shadow: none !important;
-    transition: transform 0.15s ease, background 0.15s ease !important;
-    display: inline-flex !important;
-    align-items: center !important;
-    justify-content: center !important;
-}
-[data-testid="stChatInput"] button:hover {
-    background: var(--mc-accent) !important;
-    transform: translateY(-1px) !important;
-}
-[data-testid="stChatInput"] button:disabled {
-    background: var(--mc-surface) !important;
-    border: 1px solid var(--border) !important;
-    color: var(--mc-text-subtle) !important;
-}
-[data-testid="stChatInput"] button svg {
-    width: 16px !important;
-    height: 16px !important;
-    display: block !important;
-}
 
-/* Sidebar repliée: recentre la barre sur toute la zone visible */
-body:has(section[data-testid="stSidebar"][aria-expanded="false"]) [data-testid="stChatInput"] {
-    left: 50% !important;
-    width: min(940px, calc(100vw - 2.8rem)) !important;
-}
-section[data-testid="stSidebar"][aria-expanded="false"] + div [data-testid="stChatInput"] {
-    left: 50% !important;
-    width: min(940px, calc(100vw - 2.8rem)) !important;
-}
+def _chat_message_html(msg: dict) -> str:
+    """HTML d'un message de l'historique, rendu dans son propre st.markdown."""
+    role = str(msg.get("role", "assistant"))
+    content = str(msg.get("content", ""))
+    if role == "user":
+        return _user_bubble_html(content)
+    if role == "system":
+        return f"""<div class="chat-system-note">{html_lib.escape(content)}</div>"""
+    # Lignes vides autour du contenu : il reste interprété en Markdown à l'intérieur de la carte.
+    return f"""<div class="chat-assistant-card">\n\n{content}\n\n</div>"""
 
-@media (max-width: 1280px) {
-    [data-testid="stChatInput"] {
-        --mc-sidebar-width: 300px;
-        left: calc(50% + (var(--mc-sidebar-width) / 2)) !important;
-        width: calc(100vw - var(--mc-sidebar-width) - 1.8rem) !important;
-    }
-    body:has(section[data-testid="stSidebar"][aria-expanded="false"]) [data-testid="stChatInput"] {
-        left: 50% !important;
-        width: calc(100vw - 1.8rem) !important;
-    }
-    section[data-testid="stSidebar"][aria-expanded="false"] + div [data-testid="stChatInput"] {
-        left: 50% !important;
-        width: calc(100vw - 1.8rem) !important;
-    }
-}
-@media (max-width: 900px) {
-    [data-testid="stChatInput"] {
-        left: 50% !important;
-        width: calc(100vw - 1rem) !important;
-        bottom: 12px !important;
-        border-radius: 18px !important;
-    }
-    .block-container { padding-bottom: 8rem !important; }
-}
 
-/* ── Buttons ── */
-.stButton > button,
-.stFormSubmitButton > button,
-[data-testid="stPopover"] button {
-    font-family: var(--font) !important;
-    font-size: 13px !important;
-    font-weight: 500 !important;
-    color: var(--text-2) !important;
-    background: var(--mc-card-bg) !important;
-    border: 1px solid var(--border) !important;
-    border-radius: var(--radius) !important;
-    padding: 7px 14px !important;
-    transition: all 0.15s ease !important;
-    box-shadow: 0 1px 2px rgba(0,0,0,0.04) !important;
-    cursor: pointer !important;
-}
-.stButton > button:hover,
-.stFormSubmitButton > button:hover,
-[data-testid="stPopover"] button:hover {
-    color: var(--text) !important;
-    border-color: var(--accent) !important;
-    background: var(--mc-surface) !important;
-    box-shadow: 0 1px 3px rgba(79,134,185,0.18) !important;
-}
-[data-testid="stPopover"] button {
-    width: 100% !important;
-}
-.stFormSubmitButton > button:disabled,
-[data-testid="stPopover"] button:disabled {
-    background: var(--mc-surface) !important;
-    border-color: var(--mc-border) !important;
-    color: var(--mc-text-subtle) !important;
-}
+def _user_bubble_html(content: str) -> str:
+    """HTML échappé de la bulle utilisateur, construit une seule fois par message."""
+    cache = st.session_state.user_bubble_cache
+    bubble = cache.get(content)
+    if bubble is None:
+        bubble = f"""<div class="chat-user-row"><div class="chat-user-bubble">{html_lib.escape(content)}</div></div>"""
+        cache[content] = bubble
+    return bubble
 
-/* ── Metrics ── */
-[data-testid="stMetric"] {
-    background: var(--mc-surface) !important;
-    border: 1px solid var(--border) !important;
-    border-radius: var(--radius) !important;
-    padding: 16px 18px !important;
-    box-shadow: none !important;
-}
-[data-testid="stMetricLabel"] {
-    font-family: var(--font) !important;
-    font-size: 11px !important;
-    font-weight: 500 !important;
-    letter-spacing: 0.06em !important;
-    text-transform: uppercase !important;
-    color: var(--text-3) !important;
-}
-[data-testid="stMetricValue"] {
-    font-family: var(--font-mono) !important;
-    font-size: 22px !important;
-    font-weight: 600 !important;
-    color: var(--text) !important;
-    letter-spacing: -0.02em !important;
-}
 
-/* ── Expander ── */
-[data-testid="stExpander"] {
-    border: 1px solid var(--border) !important;
-    border-radius: var(--radius) !important;
-    overflow: hidden !important;
-    background: var(--white) !important;
-}
-[data-testid="stExpander"] summary {
-    font-family: var(--font-mono) !important;
-    font-size: 11px !important;
-    font-weight: 500 !important;
-    letter-spacing: 0.05em !important;
-    color: var(--text-3) !important;
-    padding: 10px 14px !important;
-    background: var(--mc-surface) !important;
-}
+# ─── PREMIUM MINIMAL CSS ─────────────────────────────────────────────────────
+# Feuille de style de base dans static/app.css : servie par Streamlit et chargée une fois
+# dans le <head> par le script sidebar ci-dessous, elle ne transite plus à chaque rerun.
+BASE_CSS_PATH = APP_DIR / "static" / "app.css"
 
-/* ── Code ── */
-code, pre {
-    font-family: var(--font-mono) !important;
-    font-size: 12px !important;
-    background: var(--mc-surface) !important;
-    border: 1px solid var(--border) !important;
-    border-radius: 6px !important;
-    color: var(--text-2) !important;
-}
 
-/* ── Select / dropdown ── */
-[data-baseweb="select"] > div {
-    background: var(--mc-card-bg) !important;
-    border: 1px solid var(--border) !important;
-    border-radius: var(--radius) !important;
-    font-family: var(--font) !important;
-    font-size: 13px !important;
-    color: var(--text) !important;
-}
-[data-testid="stTextInput"] input::placeholder {
-    color: var(--text-3) !important;
-    opacity: 1 !important;
-}
+@st.cache_resource(show_spinner=False)
+def _base_css_version() -> str:
+    """Version (mtime) de static/app.css, lue une fois par processus : aucun stat() par rerun."""
+    return format(BASE_CSS_PATH.stat().st_mtime_ns, "x")
 
-/* ── Chat hero (état vide) ── */
-.chat-hero-spacer { height: 14vh; }
-.chat-hero-spacer-bottom { height: 10vh; }
-.chat-hero-card {
-    border: 1px solid var(--border);
-    border-radius: 14px;
-    background: linear-gradient(180deg, var(--mc-card-bg) 0%, var(--mc-surface) 100%);
-    padding: 20px 18px 14px 18px;
-    margin-bottom: 10px;
-    text-align: center;
-    box-shadow: 0 8px 28px rgba(79,134,185,0.14);
-}
-.chat-hero-title {
-    font-family: var(--font);
-    font-size: 24px;
-    line-height: 1.25;
-    letter-spacing: -0.02em;
-    color: var(--text);
-    font-weight: 600;
-    margin-bottom: 6px;
-}
-.chat-hero-subtitle {
-    font-family: var(--font);
-    font-size: 13px;
-    color: var(--text-3);
-    line-height: 1.5;
-}
-@media (max-width: 900px) {
-    .chat-hero-spacer { height: 6vh; }
-    .chat-hero-spacer-bottom { height: 5vh; }
-    .chat-hero-title { font-size: 20px; }
-}
 
-/* ── Divider ── */
-hr { border: none; border-top: 1px solid var(--border) !important; margin: 1.5rem 0 !important; }
+# Version ajoutée à l'URL de la feuille : le cache HTTP du navigateur est invalidé à chaque déploiement
+# (redémarrage du processus). Avec MC_DEV_RELOAD=1, relue à chaque rerun pour suivre les retouches du CSS.
+BASE_CSS_VERSION = (
+    format(BASE_CSS_PATH.stat().st_mtime_ns, "x")
+    if os.getenv("MC_DEV_RELOAD", "").strip() == "1"
+    else _base_css_version()
+)
 
-/* ── Scrollbar ── */
-::-webkit-scrollbar { width: 4px; height: 4px; }
-::-webkit-scrollbar-track { background: transparent; }
-::-webkit-scrollbar-thumb { background: var(--border); border-radius: 2px; }
-::-webkit-scrollbar-thumb:hover { background: var(--accent); }
 
-/* ── Alerts ── */
-.stAlert { border-radius: var(--radius) !important; border: 1px solid var(--border) !important; font-family: var(--font) !important; }
+@st.cache_data(show_spinner=False)
+def _base_css() -> str:
+    """Contenu de static/app.css, injecté en ligne seulement si le service statique est désactivé."""
+    return BASE_CSS_PATH.read_text(encoding="utf-8")
 
-/* ── Dataframe ── */
-.stDataFrame { border: 1px solid var(--border) !important; border-radius: var(--radius) !important; overflow: hidden !important; }
-</style>
-""", unsafe_allow_html=True)
 
-_theme_tokens = {
-    "Clair": {
+# Palettes (reprises dans static/app.css) : lues par _dashboard_plot_style pour les graphiques Plotly.
+_THEME_TOKENS = MappingProxyType({
+    "Clair": MappingProxyType({
         "white": "#ffffff",
         "bg": "#f7f8fa",
         "bg_subtle": "#f1f3f7",
@@ -724,8 +197,8 @@ _theme_tokens = {
         "input_border": "#9ca3af",
         "input_border_hover": "#6b7280",
         "chat_field_bg": "#ffffff",
-    },
-    "Sombre": {
+    }),
+    "Sombre": MappingProxyType({
         "white": "#111a2b",
         "bg": "#0b1220",
         "bg_subtle": "#121c2e",
@@ -750,169 +223,17 @@ _theme_tokens = {
         "input_border": "#3a5478",
         "input_border_hover": "#5f7ea6",
         "chat_field_bg": "#0f1b30",
-    },
-}
-_t = _theme_tokens.get(st.session_state.get("ui_theme", "Clair"), _theme_tokens["Clair"])
-st.markdown(
-    f"""
-<style>
-:root {{
-    --white: {_t['white']};
-    --bg: {_t['bg']};
-    --bg-subtle: {_t['bg_subtle']};
-    --border: {_t['border']};
-    --border-mid: {_t['border_mid']};
-    --text: {_t['text']};
-    --text-2: {_t['text2']};
-    --text-3: {_t['text3']};
-    --accent: {_t['accent']};
-    --accent-strong: {_t['accent_strong']};
-    --accent-dim: {_t['accent_dim']};
-    --mc-card-bg: {_t['card_bg']};
-    --mc-surface: {_t['surface']};
-    --mc-border: {_t['border']};
-    --mc-text: {_t['text']};
-    --mc-text-muted: {_t['text2']};
-    --mc-text-subtle: {_t['text3']};
-    --mc-accent: {_t['accent']};
-    --mc-accent-strong: {_t['accent_strong']};
-    --mc-warn-bg: {_t['warn_bg']};
-    --mc-warn-border: {_t['warn_border']};
-    --mc-warn: {_t['warn']};
-    --mc-warn-soft: {_t['warn_soft']};
-    --mc-danger: {_t['danger']};
-    --mc-success: {_t['success']};
-    --mc-input-bg-start: {_t['input_start']};
-    --mc-input-bg-end: {_t['input_end']};
-    --mc-input-border: {_t['input_border']};
-    --mc-input-border-hover: {_t['input_border_hover']};
-    --mc-chat-field-bg: {_t['chat_field_bg']};
-}}
-
-html, body, .stApp,
-[data-testid="stAppViewContainer"],
-[data-testid="stAppViewContainer"] > .main,
-[data-testid="stAppViewContainer"] .main .block-container {{
-    background: var(--bg) !important;
-    color: var(--text) !important;
-}}
-[data-testid="stMarkdownContainer"],
-[data-testid="stText"],
-[data-testid="stCaptionContainer"] {{
-    color: var(--text) !important;
-}}
-
-section[data-testid="stSidebar"] {{
-    background: var(--bg-subtle) !important;
-}}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label:hover {{
-    background: var(--mc-card-bg) !important;
-    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.10) !important;
-}}
-section[data-testid="stSidebar"] [data-testid="stRadio"] label:has(input:checked) {{
-    background: linear-gradient(180deg, var(--mc-card-bg) 0%, var(--mc-surface) 100%) !important;
-    box-shadow: 0 3px 10px rgba(0, 0, 0, 0.12) !important;
-}}
-
-[data-testid="stChatInput"] {{
-    background: linear-gradient(180deg, var(--mc-input-bg-start) 0%, var(--mc-input-bg-end) 100%) !important;
-    border-color: var(--mc-input-border) !important;
-}}
-[data-testid="stChatInput"]:hover {{
-    border-color: var(--mc-input-border-hover) !important;
-}}
-[data-testid="stChatInput"]:focus-within {{
-    border-color: var(--mc-accent-strong) !important;
-}}
-[data-testid="stChatInput"] button {{
-    background: var(--mc-accent-strong) !important;
-}}
-[data-testid="stChatInput"] button:hover {{
-    background: var(--mc-accent) !important;
-}}
-[data-testid="stChatInput"] button:disabled {{
-    background: var(--mc-surface) !important;
-    border-color: var(--mc-border) !important;
-    color: var(--mc-text-subtle) !important;
-}}
-[data-testid="stMetric"] {{
-    background: var(--mc-surface) !important;
-}}
-[data-baseweb="select"] > div,
-[data-testid="stTextInput"] input,
-[data-testid="stDateInputField"] input {{
-    background: var(--mc-card-bg) !important;
-    border-color: var(--mc-border) !important;
-    color: var(--mc-text) !important;
-}}
-[data-testid="stTextInput"] input::placeholder {{
-    color: var(--mc-text-subtle) !important;
-    opacity: 1 !important;
-}}
-[data-testid="stExpander"] > details,
-[data-testid="stExpander"] summary,
-[data-testid="stAlert"] {{
-    background: var(--mc-card-bg) !important;
-    border-color: var(--mc-border) !important;
-}}
-
-/* Harmonise les styles inline générés dans toute l'app */
-[style*="background:#ffffff"],
-[style*="background: #ffffff"] {{ background: var(--mc-card-bg) !important; }}
-[style*="background:#f8fafc"],
-[style*="background: #f8fafc"],
-[style*="background:#fafafa"],
-[style*="background: #fafafa"],
-[style*="background:#f7fbff"],
-[style*="background: #f7fbff"],
-[style*="background:#f0f6ff"],
-[style*="background: #f0f6ff"],
-[style*="background:#ebf3fe"],
-[style*="background: #ebf3fe"],
-[style*="background:#eff6ff"] {{ background: var(--mc-surface) !important; }}
-[style*="background: #eff6ff"] {{ background: var(--mc-surface) !important; }}
-[style*="background:#fff7ed"],
-[style*="background: #fff7ed"] {{ background: var(--mc-warn-bg) !important; }}
-[style*="border:1px solid #e5e5e5"],
-[style*="border: 1px solid #e5e5e5"],
-[style*="border:1px solid #e5e7eb"],
-[style*="border: 1px solid #e5e7eb"],
-[style*="border:1px solid #eceff3"],
-[style*="border: 1px solid #eceff3"],
-[style*="border:1px solid #d4e2f4"],
-[style*="border: 1px solid #d4e2f4"],
-[style*="border:1px solid #d4d4d8"],
-[style*="border: 1px solid #d4d4d8"] {{ border-color: var(--mc-border) !important; }}
-[style*="border:1px solid #fed7aa"],
-[style*="border: 1px solid #fed7aa"] {{ border-color: var(--mc-warn-border) !important; }}
-[style*="border-left:3px solid #2563eb"] {{ border-left-color: var(--mc-accent) !important; }}
-[style*="border-left:3px solid #ea580c"] {{ border-left-color: var(--mc-warn) !important; }}
-[style*="color:#111827"],
-[style*="color: #111827"],
-[style*="color:#404040"],
-[style*="color: #404040"],
-[style*="color:#374151"],
-[style*="color: #374151"],
-[style*="color:#334155"],
-[style*="color: #334155"],
-[style*="color:#0a0a0a"],
-[style*="color: #0a0a0a"] {{ color: var(--mc-text) !important; }}
-[style*="color:#6b7280"],
-[style*="color: #6b7280"],
-[style*="color:#9ca3af"],
-[style*="color: #9ca3af"],
-[style*="color:#a3a3a3"],
-[style*="color: #a3a3a3"] {{ color: var(--mc-text-muted) !important; }}
-[style*="color:#2563eb"] {{ color: var(--mc-accent) !important; }}
-[style*="color:#ea580c"] {{ color: var(--mc-warn) !important; }}
-[style*="color:#dc2626"] {{ color: var(--mc-danger) !important; }}
-[style*="color:#16a34a"] {{ color: var(--mc-success) !important; }}
+    }),
+})
 
-</style>
-""",
-    unsafe_allow_html=True,
-)
+# Les deux palettes sont dans static/app.css ; le thème se choisit via l'attribut data-theme
+# posé par le script ci-dessous. Rien n'est émis à chaque rerun, sauf si static/ n'est pas servi.
+if not st.get_option("server.enableStaticServing"):
+    st.markdown(f"<style>{_base_css()}</style>", unsafe_allow_html=True)
 
+# Polices Geist déclarées dans le <head> de la page (preconnect + display=swap) au lieu d'un
+# @import bloquant dans le CSS injecté. Même principe pour static/app.css. Le contenu du script
+# ne change qu'avec le thème : l'iframe n'est rechargée qu'au basculement clair/sombre.
 # Fallback robuste (Streamlit 1.54 Windows): réouverture sidebar si contrôle natif absent.
 
 components.html(
@@ -920,76 +241,137 @@ components.html(
 <script>
 (function () {
   const BTN_ID = "mc-sidebar-fallback-toggle";
+  const FONTS_ID = "mc-fonts-stylesheet";
+  const FONTS_URL = "https://fonts.googleapis.com/css2?family=Geist:wght@300;400;500;600&family=Geist+Mono:wght@400;500&display=swap";
+  const APP_CSS_ID = "mc-app-css";
+  const APP_CSS_URL = "app/static/app.css?v=__MC_CSS_VERSION__";
+  const THEME = "__MC_THEME__";
+  const NATIVE_TOGGLE_SELECTOR =
+    '[data-testid="collapsedControl"] button,' +
+    '[data-testid="stSidebarCollapsedControl"] button,' +
+    '[data-testid="stSidebarCollapseButton"] button';
+  const BTN_CSS =
+    "position:fixed;top:10px;left:10px;z-index:99999;width:34px;height:34px;" +
+    "border-radius:10px;border:1px solid rgba(180,180,180,0.6);background:rgba(255,255,255,0.92);" +
+    "box-shadow:0 6px 18px rgba(0,0,0,0.18);cursor:pointer;font-size:18px;" +
+    "display:flex;align-items:center;justify-content:center;";
+
+  function ensureFonts(doc) {
+    if (doc.getElementById(FONTS_ID)) return;
+    [["https://fonts.googleapis.com", false], ["https://fonts.gstatic.com", true]].forEach(([href, cors]) => {
+      const link = doc.createElement("link");
+      link.rel = "preconnect";
+      link.href = href;
+      if (cors) link.crossOrigin = "anonymous";
+      doc.head.appendChild(link);
+    });
+    const sheet = doc.createElement("link");
+    sheet.id = FONTS_ID;
+    sheet.rel = "stylesheet";
+    sheet.href = FONTS_URL;
+    doc.head.appendChild(sheet);
+  }
 
-  function nativeToggleExists(doc){
-    return !!doc.querySelector(
-      '[data-testid="collapsedControl"] button,' +
-      '[data-testid="stSidebarCollapsedControl"] button,' +
-      '[data-testid="stSidebarCollapseButton"] button'
-    );
+  // Streamlit sert les .css en text/plain + nosniff (un <link rel="stylesheet"> serait refusé) :
+  // on récupère le texte et on l'insère dans un <style>. Le fichier reste en cache HTTP.
+  function ensureAppCss(doc) {
+    if (doc.getElementById(APP_CSS_ID)) return;
+    const style = doc.createElement("style");
+    style.id = APP_CSS_ID;
+    doc.head.appendChild(style);
+    fetch(new URL(APP_CSS_URL, window.parent.location.href))
+      .then((resp) => (resp.ok ? resp.text() : ""))
+      .then((css) => { style.textContent = css; })
+      .catch(() => {});
   }
 
   function clickNativeToggle(doc){
-    const el = doc.querySelector(
-      '[data-testid="collapsedControl"] button,' +
-      '[data-testid="stSidebarCollapsedControl"] button,' +
-      '[data-testid="stSidebarCollapseButton"] button'
-    );
+    const el = doc.querySelector(NATIVE_TOGGLE_SELECTOR);
     if (el) el.click();
   }
 
+  // Lectures du DOM d'abord, puis écritures groupées (classe <body> plutôt qu'un sélecteur
+  // :has() coûteux dans le CSS, bouton stylé en une seule affectation cssText).
   function ensureButton() {
     const doc = window.parent.document;
-
-    // ✅ Si le bouton natif existe => on supprime/masque le fallback (donc plus de petite flèche)
-    if (nativeToggleExists(doc)) {
-      const existing = doc.getElementById(BTN_ID);
+    const sidebar = doc.querySelector('section[data-testid="stSidebar"]');
+    const collapsed = !!sidebar && sidebar.getAttribute("aria-expanded") === "false";
+    const hasNative = !!doc.querySelector(NATIVE_TOGGLE_SELECTOR);
+    const existing = doc.getElementById(BTN_ID);
+
+    doc.body.classList.toggle("mc-sidebar-collapsed", collapsed);
+    // ✅ Si le bouton natif existe => on supprime le fallback (donc plus de petite flèche)
+    if (hasNative) {
       if (existing) existing.remove();
       return;
     }
-
-    // ✅ Sinon seulement (cas bug Windows) => on crée/affiche le fallback
-    let btn = doc.getElementById(BTN_ID);
-    if (!btn) {
-      btn = doc.createElement("button");
+    // ✅ Sinon seulement (cas bug Windows) => on crée le fallback
+    if (!existing) {
+      const btn = doc.createElement("button");
       btn.id = BTN_ID;
       btn.type = "button";
       btn.setAttribute("aria-label", "Toggle sidebar");
-      btn.style.position = "fixed";
-      btn.style.top = "10px";
-      btn.style.left = "10px";
-      btn.style.zIndex = "99999";
-      btn.style.width = "34px";
-      btn.style.height = "34px";
-      btn.style.borderRadius = "10px";
-      btn.style.border = "1px solid rgba(180,180,180,0.6)";
-      btn.style.background = "rgba(255,255,255,0.92)";
-      btn.style.boxShadow = "0 6px 18px rgba(0,0,0,0.18)";
-      btn.style.cursor = "pointer";
-      btn.style.fontSize = "18px";
-      btn.style.display = "flex";
-      btn.style.alignItems = "center";
-      btn.style.justifyContent = "center";
+      btn.style.cssText = BTN_CSS;
+      btn.textContent = "›";
       btn.addEventListener("click", () => clickNativeToggle(doc));
       doc.body.appendChild(btn);
     }
+  }
 
-    btn.textContent = "›";
+  // Vérification regroupée à la frame suivante (rAF de la page parente : l'iframe de hauteur 0
+  // peut être bridée), déclenchée seulement quand Streamlit modifie le DOM.
+  let ensureScheduled = false;
+  function scheduleEnsure() {
+    if (ensureScheduled) return;
+    ensureScheduled = true;
+    window.parent.requestAnimationFrame(() => {
+      ensureScheduled = false;
+      ensureButton();
+    });
   }
 
-  ensureButton();
-  setInterval(ensureButton, 600);
+  window.parent.document.documentElement.dataset.theme = THEME;
+  ensureFonts(window.parent.document);
+  ensureAppCss(window.parent.document);
+  const observer = new MutationObserver(scheduleEnsure);
+  observer.observe(window.parent.document.body, {
+    childList: true,
+    subtree: true,
+    attributes: true,
+    attributeFilter: ["aria-expanded"],
+  });
+  window.addEventListener("pagehide", () => observer.disconnect());
+  scheduleEnsure();
 })();
 </script>
-""",
+""".replace("__MC_THEME__", st.session_state.get("ui_theme", "Clair")).replace("__MC_CSS_VERSION__", BASE_CSS_VERSION),
 height=0
 )
 
 # ─── HEADER ───────────────────────────────────────────────────────────────────
 
 
-_logo = _image_data_uri("logo.svg", "logo.png", "logo.jpg")
-_logo_html = f'<img src="{_logo}" style="height:32px; width:auto; border-radius:6px; object-fit:contain;">' if _logo else '<div style="width:32px; height:32px; background:var(--accent); border-radius:8px;"></div>'
+@st.cache_resource(show_spinner=False)
+def _header_left_html(today_label: str) -> str:
+    """Logo, titre et date du header en un seul bloc HTML (reconstruit une fois par jour)."""
+    logo = _image_data_uri("logo.svg", "logo.png", "logo.jpg")
+    logo_html = (
+        f'<img src="{logo}" style="height:32px; width:auto; border-radius:6px; object-fit:contain;">'
+        if logo
+        else '<div style="width:32px; height:32px; background:var(--accent); border-radius:8px;"></div>'
+    )
+    return f"""
+    <div class="app-top-header-left" style="display:flex; align-items:center; gap:12px;">
+        {logo_html}
+        <div>
+            <span style="font-family:'Geist',sans-serif; font-size:16px; font-weight:600; color:var(--text); letter-spacing:-0.02em;">Mobility Copilot</span>
+            <span style="font-family:'Geist',sans-serif; font-size:13px; color:var(--text-3); margin-left:10px; font-weight:400;">Montréal</span>
+        </div>
+        <div style="margin-left:auto; font-family:'Geist Mono',monospace; font-size:11px; color:var(--text-3);">{today_label}</div>
+    </div>
+    """
+
+
 _has_chat_messages = bool(st.session_state.get("chat_history", []))
 _show_chat_clear = (
     st.session_state.get("current_page") == "Chat analytique"
@@ -999,77 +381,83 @@ _show_top_header = not (
     st.session_state.get("current_page") == "Chat analytique"
     and not _has_chat_messages
 )
+# Grille fixe : le toggle de thème est rendu une seule fois, à la même place, que le header
+# soit affiché ou non (chat vide) — pas de second widget ni de changement de colonnes.
+header_cols = st.columns([7.5, 0.5, 1.0], gap="small")
+if _show_top_header:
+    with header_cols[0]:
+        st.markdown(_header_left_html(datetime.now().strftime("%d %b %Y")), unsafe_allow_html=True)
+with header_cols[1]:
+    st.toggle(
+        "Mode sombre",
+        key="theme_dark_toggle",
+        label_visibility="collapsed",
+        help="Basculer mode clair / sombre",
+    )
+if _show_chat_clear:
+    with header_cols[2]:
+        if st.button("Effacer", key="clear_chat_header", use_container_width=True):
+            _reset_chat_state()
+            st.rerun()
 if _show_top_header:
-    header_left, header_right = st.columns([6.6, 2.4], gap="small")
-    with header_left:
-        st.markdown(
-            f"""
-            <div class="app-top-header-left" style="display:flex; align-items:center; gap:12px;">
-                {_logo_html}
-                <div>
-                    <span style="font-family:'Geist',sans-serif; font-size:16px; font-weight:600; color:var(--text); letter-spacing:-0.02em;">Mobility Copilot</span>
-                    <span style="font-family:'Geist',sans-serif; font-size:13px; color:var(--text-3); margin-left:10px; font-weight:400;">Montréal</span>
-                </div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-    with header_right:
-        if _show_chat_clear:
-            switch_col, clear_col, date_col = st.columns([0.8, 1.7, 1.6], gap="small")
-            with switch_col:
-                st.toggle(
-                    "Mode sombre",
-                    key="theme_dark_toggle",
-                    label_visibility="collapsed",
-                    help="Basculer mode clair / sombre",
-                )
-            with clear_col:
-                if st.button("Effacer", key="clear_chat_header", use_container_width=True):
-                    _reset_chat_state()
-                    st.rerun()
-            with date_col:
-                st.markdown(
-                    f"""<div style="text-align:right; font-family:'Geist Mono',monospace; font-size:11px; color:var(--text-3); padding-top:6px;">{datetime.now().strftime("%d %b %Y")}</div>""",
-                    unsafe_allow_html=True,
-                )
-        else:
-            switch_col, date_col = st.columns([1.1, 2.0], gap="small")
-            with switch_col:
-                st.toggle(
-                    "Mode sombre",
-                    key="theme_dark_toggle",
-                    label_visibility="collapsed",
-                    help="Basculer mode clair / sombre",
-                )
-            with date_col:
-                st.markdown(
-                    f"""<div style="text-align:right; font-family:'Geist Mono',monospace; font-size:11px; color:var(--text-3); padding-top:6px;">{datetime.now().strftime("%d %b %Y")}</div>""",
-                    unsafe_allow_html=True,
-                )
     st.markdown("<div class='app-top-header-divider' style='border-bottom:1px solid var(--border); margin:0 0 26px 0;'></div>", unsafe_allow_html=True)
-else:
-    # État initial du chat: pas de header, mais switch de thème disponible.
-    _sw_spacer, _sw_col = st.columns([8.6, 1.4], gap="small")
-    with _sw_col:
-        st.toggle(
-            "Mode sombre",
-            key="theme_dark_toggle",
-            label_visibility="collapsed",
-            help="Basculer mode clair / sombre",
-        )
 
 # ─── LOAD DATA ────────────────────────────────────────────────────────────────
-@st.cache_data(show_spinner=False)
-def get_data():
-    return load_all_data()
+# Données et moteurs partagés entre reruns et sessions, rafraîchis toutes les 6 h
+# (cadence de mise à jour des jeux 311 / collisions).
+DATA_TTL_SECONDS = 6 * 3600
+
+
+# persist="disk" : les tables survivent aux redémarrages du serveur (pickle relu au lieu
+# d'un rechargement complet). Streamlit ignore `ttl` avec persist : la fraîcheur passe par
+# `refresh_slot`, l'index de la tranche de DATA_TTL_SECONDS en cours. max_entries=1 borne la
+# mémoire à la tranche courante ; le disque, que max_entries n'évince pas, est élagué par
+# _prune_stale_data_pickles, hors du corps mis en cache.
+@st.cache_data(show_spinner=False, persist="disk", max_entries=1)
+def get_data(refresh_slot: int):
+    _ = refresh_slot
+    data = load_all_data()
+    # Dates converties une fois par chargement (les tables gardent leurs chaînes "%Y-%m-%d",
+    # attendues par le moteur de requêtes), et bornes globales pour la sidebar.
+    data["parsed_dates"] = {
+        key: pd.to_datetime(data[key]["date"], errors="coerce")
+        for key in ("collisions", "req311")
+        if "date" in data[key].columns
+    }
+    data["date_bounds"] = get_global_date_bounds(data)
+    return data
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _prune_stale_data_pickles(refresh_slot: int) -> None:
+    """Supprime les pickles des tranches précédentes, une fois par tranche et par processus.
+
+    get_data est la seule fonction persistée sur disque : tout .memo antérieur au début de la
+    tranche courante appartient à une tranche révolue (celui de la tranche courante est plus récent).
+    """
+    slot_start = refresh_slot * DATA_TTL_SECONDS
+    for path in pathlib.Path(get_cache_folder_path()).glob("*.memo"):
+        try:
+            if path.stat().st_mtime < slot_start:
+                path.unlink()
+        except OSError:
+            continue
+
+
+# Avec MC_DEV_RELOAD=1, les moteurs sont reconstruits quand l'une de ces sources change.
+ENGINE_SOURCE_FILES = tuple(APP_DIR / name for name in ("app.py", "query_engine.py", "rag_engine.py"))
+
+
+@st.cache_resource(show_spinner=False, ttl=DATA_TTL_SECONDS, max_entries=2)
+def get_engines(_data, refresh_slot: int, cache_buster: tuple[int, ...]):
+    # `_data` n'est pas haché (déjà mis en cache par get_data) : la clé est `refresh_slot`, la
+    # tranche de get_data (moteurs reconstruits avec les données), et `cache_buster`, qui
+    # invalide le cache quand app.py/query_engine.py/rag_engine.py changent (MC_DEV_RELOAD=1).
+    _ = refresh_slot, cache_buster
+    from rag_engine import RAGEngine
 
-@st.cache_resource(show_spinner=False)
-def get_engines(data, cache_buster: tuple[int, int, int]):
-    # `cache_buster` invalide le cache quand app.py/query_engine.py/rag_engine.py changent.
-    _ = cache_buster
     rag = RAGEngine()
-    qe = QueryEngine(data)
+    qe = QueryEngine(_data)
     return rag, qe
 
 
@@ -1080,6 +468,9 @@ PERIOD_TO_DAYS = {
     "12 derniers mois": 365,
 }
 
+# Format produit par la sidebar, découpé sans regex ; CUSTOM_PERIOD_RE couvre les saisies libres.
+CUSTOM_PERIOD_PREFIX = "Personnalisée : "
+CUSTOM_PERIOD_SEP = " -> "
 CUSTOM_PERIOD_RE = re.compile(
     r"Personnalisée\s*:\s*(\d{4}-\d{2}-\d{2})\s*(?:->|→)\s*(\d{4}-\d{2}-\d{2})",
     flags=re.IGNORECASE,
@@ -1089,6 +480,15 @@ CUSTOM_PERIOD_RE = re.compile(
 def parse_custom_period(periode: str) -> tuple[pd.Timestamp, pd.Timestamp] | None:
     if not isinstance(periode, str):
         return None
+    if periode.startswith(CUSTOM_PERIOD_PREFIX):
+        bounds = periode[len(CUSTOM_PERIOD_PREFIX):].split(CUSTOM_PERIOD_SEP)
+        if len(bounds) == 2:
+            try:
+                start, end = (pd.Timestamp(date.fromisoformat(b)) for b in bounds)
+            except ValueError:
+                pass
+            else:
+                return (end, start) if start > end else (start, end)
     m = CUSTOM_PERIOD_RE.search(periode)
     if not m:
         return None
@@ -1106,7 +506,10 @@ def get_global_date_bounds(data: dict) -> tuple[date, date]:
     for key in ("collisions", "req311"):
         df = data.get(key, pd.DataFrame())
         if isinstance(df, pd.DataFrame) and not df.empty and "date" in df.columns:
-            d = pd.to_datetime(df["date"], errors="coerce").dropna()
+            d = data.get("parsed_dates", {}).get(key, df["date"])
+            if not pd.api.types.is_datetime64_any_dtype(d):
+                d = pd.to_datetime(d, errors="coerce")
+            d = d.dropna()
             if not d.empty:
                 mins.append(d.min().date())
                 maxs.append(d.max().date())
@@ -1117,13 +520,20 @@ def get_global_date_bounds(data: dict) -> tuple[date, date]:
 
 
 def _to_date_safe(value, fallback: date) -> date:
-    if isinstance(value, date):
+    # Cas courant du date_input en premier ; datetime (et pd.Timestamp, sa sous-classe)
+    # avant date, dont il hérite, pour toujours renvoyer une vraie date.
+    if type(value) is date:
         return value
-    if isinstance(value, pd.Timestamp):
-        return value.date()
     if isinstance(value, datetime):
         return value.date()
-    if isinstance(value, (list, tuple, set, np.ndarray, pd.Series, pd.Index)):
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.strip()).date()
+        except ValueError:
+            pass
+    elif isinstance(value, (list, tuple, set, np.ndarray, pd.Series, pd.Index)):
         seq = list(value)
         if not seq:
             return fallback
@@ -1154,23 +564,39 @@ def _normalize_date_range(value, fallback_start: date, fallback_end: date) -> tu
     return start_date, end_date
 
 
-def filter_df_by_period(df: pd.DataFrame, periode: str) -> pd.DataFrame:
+def filter_df_by_period(df: pd.DataFrame, periode: str, dates: pd.Series | None = None) -> pd.DataFrame:
+    """`dates` : colonne `date` déjà convertie (voir get_data), sinon convertie ici.
+
+    Le masque booléen produit déjà un nouveau DataFrame : pas de .copy() supplémentaire,
+    et `df` est renvoyé tel quel si la fenêtre couvre tout l'historique. Les consommateurs
+    qui modifient le résultat le copient eux-mêmes.
+    """
     if df is None or df.empty or "date" not in df.columns:
         return df.copy() if isinstance(df, pd.DataFrame) else df
 
-    dates = pd.to_datetime(df["date"], errors="coerce")
-    custom = parse_custom_period(periode)
+    if dates is None:
+        dates = df["date"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors="coerce")
+    # Périodes prédéfinies (cas courant) : simple lookup, sans analyse de chaîne.
+    days = PERIOD_TO_DAYS.get(periode)
+    custom = parse_custom_period(periode) if days is None else None
+    anchor = dates.max()
+    # Fenêtre englobant toutes les dates (fréquent sur l'historique court de démo) : ni masque ni copie.
+    fully_dated = dates.count() == len(dates)
     if custom is not None:
         start, end = custom
-        return df.loc[(dates >= start) & (dates <= end)].copy()
+        if fully_dated and start <= dates.min() and anchor <= end:
+            return df
+        return df.loc[((dates >= start) & (dates <= end)).to_numpy()]
 
-    anchor = dates.max()
     if pd.isna(anchor):
         return df.copy()
 
-    days = PERIOD_TO_DAYS.get(periode, 30)
-    cutoff = anchor - pd.Timedelta(days=days)
-    return df.loc[dates >= cutoff].copy()
+    cutoff = anchor - pd.Timedelta(days=days or 30)
+    if fully_dated and cutoff <= dates.min():
+        return df
+    return df.loc[(dates >= cutoff).to_numpy()]
 
 
 def compute_hotspots_df(collisions: pd.DataFrame) -> pd.DataFrame:
@@ -1187,24 +613,27 @@ def compute_hotspots_df(collisions: pd.DataFrame) -> pd.DataFrame:
     if coll.empty:
         return pd.DataFrame(columns=["lieu", "collisions", "graves", "heure_moyenne", "tendance"])
 
+    # Indicateur grave précalculé : la somme reste dans le chemin Cython du groupby.
+    coll["_grave"] = (coll["gravite_num"] >= 3).to_numpy(dtype=np.int64)
     hotspots = (coll.groupby("intersection")
         .agg(
             collisions=("gravite_num", "count"),
-            graves=("gravite_num", lambda x: (x >= 3).sum()),
+            graves=("_grave", "sum"),
             heure_moyenne=("heure", "mean"),
         )
         .reset_index()
-        .sort_values("collisions", ascending=False)
-        .head(5))
+        .nlargest(5, "collisions"))
     hotspots["lieu"] = hotspots["intersection"].astype(str)
     hotspots["tendance"] = ""
     return hotspots
 
 
-def compute_meteo_corr_df(collisions: pd.DataFrame) -> pd.DataFrame:
+def compute_meteo_corr_df(collisions: pd.DataFrame, dates: pd.Series | None = None) -> pd.DataFrame:
+    """`dates` : dates déjà converties des lignes de `collisions` (clé de regroupement entière)."""
     if collisions is None or collisions.empty:
         return pd.DataFrame(columns=["date", "collisions", "temperature", "precipitation"])
-    return (collisions.groupby("date")
+    keys = collisions["date"] if dates is None else dates.dt.normalize().rename("date")
+    corr = (collisions.groupby(keys)
         .agg(
             collisions=("gravite_num", "count"),
             temperature=("temperature", "mean"),
@@ -1212,6 +641,13 @@ def compute_meteo_corr_df(collisions: pd.DataFrame) -> pd.DataFrame:
         )
         .reset_index()
         .tail(120))
+    if dates is not None:
+        # Même format "%Y-%m-%d" que la colonne source, seulement sur les lignes conservées.
+        corr["date"] = corr["date"].dt.strftime("%Y-%m-%d")
+    return corr
+
+
+WEEKLY_TREND_WEEKS = 12
 
 
 def compute_weekly_trend_df(collisions: pd.DataFrame, req311: pd.DataFrame) -> pd.DataFrame:
@@ -1229,17 +665,234 @@ def compute_weekly_trend_df(collisions: pd.DataFrame, req311: pd.DataFrame) -> p
     else:
         anchor = max(coll_max, req_max).to_pydatetime()
 
+    # Une passe par table : nombre de jours avant l'ancre, compté par jour puis cumulé.
+    # Semaine i = [fin - 7 j, fin] bornes incluses, comme l'ancienne comparaison de chaînes.
+    anchor_day = pd.Timestamp(anchor).normalize()
+    n_days = WEEKLY_TREND_WEEKS * 7 + 1
+
+    def _weekly_counts(dates: pd.Series) -> np.ndarray:
+        offsets = (anchor_day - dates).dt.days.dropna().to_numpy(dtype=np.int64)
+        offsets = offsets[(offsets >= 0) & (offsets < n_days)]
+        cumul = np.concatenate(([0], np.bincount(offsets, minlength=n_days).cumsum()))
+        starts = np.arange(WEEKLY_TREND_WEEKS) * 7
+        return cumul[starts + 8] - cumul[starts]
+
+    coll_counts = _weekly_counts(coll_dates)
+    req_counts = _weekly_counts(req_dates)
     rows = []
-    for i in range(12):
+    for i in range(WEEKLY_TREND_WEEKS):
         end = anchor - timedelta(weeks=i)
-        start = end - timedelta(weeks=1)
-        s, e = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
-        c = int(((collisions["date"] >= s) & (collisions["date"] <= e)).sum()) if "date" in collisions.columns else 0
-        r = int(((req311["date"] >= s) & (req311["date"] <= e)).sum()) if "date" in req311.columns else 0
-        rows.append({"semaine": end.strftime("S%V\n%d %b"), "collisions": c, "req311": r})
+        rows.append({
+            "semaine": end.strftime("S%V\n%d %b"),
+            # Libellé d'axe sur une ligne, produit ici plutôt qu'à chaque construction du graphique.
+            "semaine_label": end.strftime("S%V %d %b"),
+            "collisions": int(coll_counts[i]),
+            "req311": int(req_counts[i]),
+        })
     return pd.DataFrame(rows[::-1])
 
 
+# cache_resource : les mêmes tables sont rendues à chaque rerun, sans copie pickle.
+# Les pages les lisent sans les modifier (copie locale avant toute écriture).
+@st.cache_resource(show_spinner=False, ttl=DATA_TTL_SECONDS)
+def build_period_views(_data: dict, periode: str, data_version: tuple) -> dict:
+    """Tables filtrées et agrégats d'une période, calculés une fois par période."""
+    # `_data` n'est pas haché : `data_version` (tranche de get_data, tailles, bornes de dates) invalide le cache au rechargement.
+    _ = data_version
+    parsed_dates = _data.get("parsed_dates", {})
+    coll_dates = parsed_dates.get("collisions")
+    collisions = filter_df_by_period(_data["collisions"], periode, coll_dates)
+    req311 = filter_df_by_period(_data["req311"], periode, parsed_dates.get("req311"))
+    return {
+        "collisions": collisions,
+        "req311": req311,
+        "hotspots": compute_hotspots_df(collisions),
+        "meteo_corr": compute_meteo_corr_df(
+            collisions, None if coll_dates is None else coll_dates.loc[collisions.index]
+        ),
+        "weekly_trend": compute_weekly_trend_df(collisions, req311),
+    }
+
+
+def _severe_mask(collisions: pd.DataFrame) -> np.ndarray:
+    """Collisions graves (gravite_num >= 3) ; valeurs manquantes ou non numériques : non graves."""
+    grav = collisions["gravite_num"]
+    if grav.dtype.kind in "iuf":
+        # Colonne numpy numérique (cas des loaders) : comparaison directe, NaN >= 3 est faux.
+        return grav.to_numpy() >= 3
+    return (pd.to_numeric(grav, errors="coerce").fillna(0) >= 3).to_numpy()
+
+
+# Gabarits HTML du dashboard, construits une fois : seuls les champs variables sont substitués.
+HOTSPOT_CARD_HTML = """
+<div style="background:var(--mc-card-bg); border:1px solid var(--mc-border); border-left:4px solid {color}; border-radius:10px; padding:8px 10px; margin-bottom:6px;">
+    <div style="display:flex; justify-content:space-between; align-items:center;">
+        <span style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.08em;">ZONE #{rank}</span>
+        <span style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:{color};">{total} collisions</span>
+    </div>
+    <div style="font-size:12px; font-weight:600; color:var(--mc-text); margin:3px 0 4px 0;">{place}</div>
+    <div style="font-size:11px; color:var(--mc-text-muted);">{graves} graves · {hour}</div>
+</div>
+"""
+INSIGHT_BANNER_HTML = """
+<div style="background:var(--mc-surface); border:1px solid var(--mc-border); border-left:4px solid var(--mc-accent); border-radius:12px; padding:12px 14px; margin-bottom:10px;">
+  <div style="font-family:'Geist Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.08em; margin-bottom:6px; text-transform:uppercase;">Insight principal</div>
+  <div style="font-size:15px; color:var(--mc-text); line-height:1.6; font-weight:600; margin-bottom:4px;">{zone}</div>
+  <div style="font-size:12px; color:var(--mc-text-muted); line-height:1.6;">{trend} Contexte dominant observé: <strong>{meteo}</strong>.</div>
+</div>
+"""
+
+
+def _insight_zone_text(hotspots: pd.DataFrame) -> str:
+    if hotspots.empty:
+        return "Aucune zone prioritaire détectée sur la période."
+    top_h = hotspots.iloc[0]
+    zone_name = str(top_h.get("lieu", "zone principale"))
+    zone_coll = int(top_h.get("collisions", 0))
+    zone_graves = int(top_h.get("graves", 0))
+    return f"Zone prioritaire: {zone_name} ({zone_coll} collisions, {zone_graves} graves)."
+
+
+KPI_CARD_HTML = """<div class="kpi-card"><div class="kpi-label">{label}</div><div class="kpi-value">{value}</div><div class="kpi-sub">{sub}</div></div>"""
+
+
+def _fmt_int(n: int) -> str:
+    return f"{n:,}".replace(",", " ")
+
+
+def _kpi_grid_html(coll_total: int, graves_n: int, grave_rate: float, req_total: int,
+                   top_meteo_label: str, top_req_label: str) -> str:
+    """Les quatre KPI du dashboard en un seul bloc HTML (un élément au lieu de cinq).
+
+    Appelé par compute_dashboard_aggregates : le bloc est mis en cache avec les agrégats de la période.
+    """
+    cards = (
+        ("Collisions", _fmt_int(coll_total), ""),
+        ("Collisions graves", _fmt_int(graves_n), f"{grave_rate:.1f}% du total"),
+        ("Requêtes 311", _fmt_int(req_total), ""),
+        ("Contexte dominant", top_meteo_label or "n/a", top_req_label[:22]),
+    )
+    esc = html_lib.escape
+    return '<div class="kpi-grid">' + "".join(
+        KPI_CARD_HTML.format(label=esc(label), value=esc(value), sub=esc(sub)) for label, value, sub in cards
+    ) + "</div>"
+
+
+def _hotspot_cards_html(hotspots: pd.DataFrame) -> list[str]:
+    """Cartes HTML du top 5 des zones, numérotées comme les repères #1..#5 de la carte."""
+    if hotspots.empty:
+        return []
+    totals = hotspots["collisions"].fillna(0).astype(int).to_numpy()
+    # Variables thématiques (teintes adoucies en mode sombre) ; l'ambre #d97706 est commun aux deux thèmes.
+    colors = np.where(totals >= 25, "var(--mc-danger)", np.where(totals >= 15, "#d97706", "var(--mc-accent)"))
+    graves = hotspots["graves"].fillna(0).astype(int)
+    cards = []
+    for rank, (total, severity_color, h, n_graves, place) in enumerate(
+        zip(totals, colors, hotspots["heure_moyenne"], graves, hotspots["lieu"].astype(str)), start=1
+    ):
+        h_txt = "heure inconnue" if pd.isna(h) else f"pic vers {int(round(float(h)))}h"
+        cards.append(HOTSPOT_CARD_HTML.format(
+            color=severity_color, rank=rank, total=total, place=place, graves=n_graves, hour=h_txt,
+        ))
+    return cards
+
+
+def _weekly_trend_line(weekly: pd.DataFrame) -> str:
+    """Phrase de tendance : dernière semaine comparée à la précédente."""
+    counts = weekly["collisions"].to_numpy(dtype="float64") if "collisions" in weekly.columns else np.empty(0)
+    if counts.size < 2 or not np.isfinite(counts[-2:]).all():
+        return "Tendance hebdomadaire en cours de calcul."
+    c_prev, c_last = int(counts[-2]), int(counts[-1])
+    delta = c_last - c_prev
+    pct = (delta / c_prev * 100.0) if c_prev > 0 else 0.0
+    trend_word = "hausse" if delta > 0 else "baisse" if delta < 0 else "stabilité"
+    return f"Tendance récente: {trend_word} hebdomadaire ({delta:+d}, {pct:+.1f}%)."
+
+
+def _factorize_counts(values: pd.Series, missing: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Codes entiers (ordre d'apparition), libellés et effectifs : un passage, sans tri."""
+    codes, labels = pd.factorize(values.fillna(missing).astype(str))
+    return codes, np.asarray(labels, dtype=object), np.bincount(codes, minlength=len(labels))
+
+
+def compute_dashboard_aggregates(
+    collisions: pd.DataFrame, req311: pd.DataFrame, hotspots: pd.DataFrame, weekly: pd.DataFrame
+) -> dict:
+    """KPI, top 311, agrégat météo, points chauds de la carte et cartes du top 5 pour le dashboard."""
+    severe = _severe_mask(collisions) if "gravite_num" in collisions.columns else None
+    graves_n = int(np.count_nonzero(severe)) if severe is not None else 0
+    coll_total = int(len(collisions))
+
+    top_req_label = "n/a"
+    req_types = None
+    if not req311.empty and "type_service" in req311.columns:
+        _, req_labels, req_counts = _factorize_counts(req311["type_service"], "Non spécifié")
+        top_req_label = str(req_labels[req_counts.argmax()])
+        # Top 8 par effectif décroissant, égalités dans l'ordre d'apparition (comme value_counts).
+        top8 = np.argsort(-req_counts, kind="stable")[:8]
+        req_types = pd.DataFrame({"type_service": req_labels[top8], "total": req_counts[top8]})
+
+    top_meteo_label = "n/a"
+    weather = None
+    if not collisions.empty and "condition_meteo" in collisions.columns:
+        # Un seul encodage, partagé par le contexte dominant et l'agrégat météo.
+        meteo_codes, meteo_labels, meteo_counts = _factorize_counts(collisions["condition_meteo"], "Inconnue")
+        top_meteo_label = str(meteo_labels[meteo_counts.argmax()])
+        meteo_graves = np.bincount(meteo_codes, weights=severe, minlength=len(meteo_labels))
+        weather = pd.DataFrame(
+            {"collisions": meteo_counts, "graves": meteo_graves.astype(np.int64)},
+            index=pd.Index(meteo_labels, name="condition_meteo"),
+        ).sort_index()
+        weather["taux_graves"] = (weather["graves"] / weather["collisions"].clip(lower=1) * 100).round(1)
+        weather = (
+            weather.drop(columns="graves")
+            .nlargest(8, "collisions")
+            .sort_values("collisions", ascending=True)
+            .reset_index()
+        )
+
+    top_points = None
+    if {"intersection", "latitude", "longitude"}.issubset(collisions.columns):
+        top_points = (
+            collisions.groupby("intersection")
+            .agg(
+                total=("gravite_num", "count"),
+                latitude=("latitude", "mean"),
+                longitude=("longitude", "mean"),
+            )
+            .nlargest(5, "total")
+            .reset_index()
+        )
+
+    req_total = int(len(req311))
+    grave_rate = (graves_n / coll_total * 100) if coll_total > 0 else 0.0
+    return {
+        "coll_total": coll_total,
+        "req_total": req_total,
+        "graves_n": graves_n,
+        "grave_rate": grave_rate,
+        "top_req_label": top_req_label,
+        "top_meteo_label": top_meteo_label,
+        "req_types": req_types,
+        "weather": weather,
+        "top_points": top_points,
+        "hotspot_cards": _hotspot_cards_html(hotspots),
+        "insight_html": INSIGHT_BANNER_HTML.format(
+            zone=_insight_zone_text(hotspots), trend=_weekly_trend_line(weekly), meteo=top_meteo_label,
+        ),
+        "kpi_html": _kpi_grid_html(coll_total, graves_n, grave_rate, req_total, top_meteo_label, top_req_label),
+    }
+
+
+@st.cache_data(show_spinner=False, ttl=DATA_TTL_SECONDS)
+def build_dashboard_aggregates(_data: dict, periode: str, data_version: tuple) -> dict:
+    """Agrégats du dashboard d'une période : les reruns hors changement de période relisent le cache."""
+    views = build_period_views(_data, periode, data_version)
+    return compute_dashboard_aggregates(
+        views["collisions"], views["req311"], views["hotspots"], views["weekly_trend"]
+    )
+
+
 def _build_ambiguity_card(reason: str, options: list[str], question: str) -> str:
     return f"""<div style="background:var(--mc-card-bg); border:1px solid var(--mc-border); border-left:3px solid var(--mc-accent); border-radius:8px; padding:14px;">
 <div style="font-family:'Geist Mono',monospace; font-size:10px; color:var(--mc-accent); letter-spacing:0.1em; margin-bottom:10px;">DÉTECTION D'AMBIGUÏTÉ</div>
@@ -1249,10 +902,13 @@ def _build_ambiguity_card(reason: str, options: list[str], question: str) -> str
 </div>"""
 
 
+CHOICE_LABEL_PREFIX_RE = re.compile(r"^[^\wÀ-ÿ]+")
+
+
 def _clean_choice_label(text: str) -> str:
     t = (text or "").strip()
     # Supprime les icônes/emojis en tête pour un rendu plus sobre.
-    t = re.sub(r"^[^\wÀ-ÿ]+", "", t)
+    t = CHOICE_LABEL_PREFIX_RE.sub("", t)
     return t.strip()
 
 
@@ -1269,19 +925,31 @@ def _refine_question_with_choice(question: str, choice_text: str) -> str:
     return f"Analyse orientée: {choice_text}. Question: {question}"
 
 
-def save_weekly_briefing_snapshots(data: dict):
-    now = datetime.now()
-    iso_year, iso_week, _ = now.isocalendar()
-    out_dir = pathlib.Path(__file__).parent / "outputs" / "briefings"
-    out_dir.mkdir(parents=True, exist_ok=True)
+BRIEFING_SNAPSHOT_DIR = APP_DIR / "outputs" / "briefings"
+BRIEFING_SNAPSHOT_TONES = (("municipal", "municipalite"), ("public", "grand_public"))
+
 
+# Noms dérivés de la semaine ISO (aucun listage du dossier), calculés dans le job hebdo mis en
+# cache : les reruns relisent le résultat du job sans reconstruire ces chemins.
+def _briefing_snapshot_paths(iso_year: int, iso_week: int) -> tuple[pathlib.Path, ...]:
+    return tuple(
+        BRIEFING_SNAPSHOT_DIR / f"briefing_{iso_year}_W{iso_week}_{suffix}.html"
+        for _, suffix in BRIEFING_SNAPSHOT_TONES
+    )
+
+
+def _write_weekly_briefing_snapshots(data: dict, iso_year: int, iso_week: int) -> tuple[pathlib.Path, ...]:
+    """Écrit les snapshots manquants de la semaine et renvoie ceux présents sur disque."""
+    from briefing import generate_briefing
+
+    BRIEFING_SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
     week_data = dict(data)
-    week_data["collisions"] = filter_df_by_period(data["collisions"], "7 derniers jours")
-    week_data["req311"] = filter_df_by_period(data["req311"], "7 derniers jours")
+    parsed_dates = data.get("parsed_dates", {})
+    week_data["collisions"] = filter_df_by_period(data["collisions"], "7 derniers jours", parsed_dates.get("collisions"))
+    week_data["req311"] = filter_df_by_period(data["req311"], "7 derniers jours", parsed_dates.get("req311"))
 
-    outputs = []
-    for tone, suffix in [("municipal", "municipalite"), ("public", "grand_public")]:
-        out_file = out_dir / f"briefing_{iso_year}_W{iso_week}_{suffix}.html"
+    paths = _briefing_snapshot_paths(iso_year, iso_week)
+    for (tone, _), out_file in zip(BRIEFING_SNAPSHOT_TONES, paths):
         if not out_file.exists():
             html = generate_briefing(
                 week_data,
@@ -1290,54 +958,74 @@ def save_weekly_briefing_snapshots(data: dict):
                 reference_data=data,
             )
             out_file.write_text(html, encoding="utf-8")
-        outputs.append(out_file)
-    return outputs
+    return tuple(path for path in paths if path.exists())
+
+
+SNAPSHOT_LOGGER = logging.getLogger("mobility_copilot.snapshots")
+
+
+def _report_snapshot_error(job: Future) -> None:
+    exc = job.exception()
+    if exc is not None:
+        SNAPSHOT_LOGGER.error("Échec des snapshots briefing hebdo", exc_info=exc)
+
+
+@st.cache_resource(show_spinner=False)
+def _weekly_briefing_job(iso_year: int, iso_week: int, _data: dict) -> Future:
+    """Génération des snapshots de la semaine, lancée une seule fois par processus, hors du rerun."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mc-briefing-snapshots")
+    job = executor.submit(_write_weekly_briefing_snapshots, _data, iso_year, iso_week)
+    job.add_done_callback(_report_snapshot_error)
+    executor.shutdown(wait=False)
+    return job
+
+
+def save_weekly_briefing_snapshots(data: dict) -> tuple[pathlib.Path, ...]:
+    """Snapshots de la semaine réellement écrits ; vide tant que la génération n'a pas abouti."""
+    iso_year, iso_week, _ = datetime.now().isocalendar()
+    # Clé = semaine ISO : aucun accès disque ni génération sur les reruns suivants.
+    job = _weekly_briefing_job(iso_year, iso_week, data)
+    if not job.done():
+        return ()
+    if job.exception() is not None:
+        # Échec déjà journalisé : le job n'est pas gardé, le prochain rerun relance la génération.
+        _weekly_briefing_job.clear()
+        return ()
+    return job.result()
 
 if "boot_splash_done" not in st.session_state:
     st.session_state.boot_splash_done = False
 
+@st.cache_resource(show_spinner=False)
+def _splash_html() -> str:
+    """Écran de chargement (styles et variante sombre dans static/app.css, section Boot splash)."""
+    logo = _image_data_uri("logo.svg", "logo_bande.svg", "logo.png", "logo.jpg")
+    logo_html = f'<img class="mc-splash-logo" src="{logo}">' if logo else '<div class="mc-splash-logo-fallback"></div>'
+    return f"""
+    <div class="mc-splash">
+      <div class="mc-splash-inner">
+        {logo_html}
+        <div class="mc-splash-title">Chargement des données à Montréal ...</div>
+        <div class="mc-splash-dots"><span></span><span></span><span></span></div>
+      </div>
+    </div>
+    """
+
+
 _splash = st.empty() if not st.session_state.boot_splash_done else None
 if _splash is not None:
-    _dark_mode = st.session_state.get("ui_theme") == "Sombre"
-    _splash_bg = "rgba(11,18,32,0.98)" if _dark_mode else "rgba(255,255,255,0.98)"
-    _splash_text = "#e6edf7" if _dark_mode else "#0a0a0a"
-    _splash_dot_color = "#93c5fd" if _dark_mode else "#2563eb"
-    _splash_fallback_box = "#17263d" if _dark_mode else "#0a0a0a"
-    _splash_logo = _image_data_uri("logo.svg", "logo_bande.svg", "logo.png", "logo.jpg")
-    _splash_img = (
-        f"""<img src="{_splash_logo}" style="width:min(360px, 72vw); height:auto; object-fit:contain; margin-bottom:16px;">"""
-        if _splash_logo
-        else f"""<div style="width:88px; height:88px; border-radius:18px; background:{_splash_fallback_box}; margin:0 auto 18px auto;"></div>"""
-    )
-    _splash.markdown(
-        f"""
-        <style>
-          @keyframes mc-pulse {{ 0%, 100% {{ opacity: 0.22; transform: translateY(0); }} 50% {{ opacity: 1; transform: translateY(-2px); }} }}
-        </style>
-        <div style="position:fixed; inset:0; z-index:9999; background:{_splash_bg}; display:flex; align-items:center; justify-content:center;">
-          <div style="text-align:center; padding:24px;">
-            {_splash_img}
-            <div style="font-family:'Geist',sans-serif; font-size:22px; font-weight:600; color:{_splash_text}; letter-spacing:-0.01em;">
-              Chargement des données à Montréal ...
-            </div>
-            <div style="margin-top:12px; display:flex; gap:8px; justify-content:center;">
-              <span style="width:8px; height:8px; border-radius:50%; background:{_splash_dot_color}; animation:mc-pulse 1.1s infinite ease-in-out;"></span>
-              <span style="width:8px; height:8px; border-radius:50%; background:{_splash_dot_color}; animation:mc-pulse 1.1s infinite ease-in-out 0.18s;"></span>
-              <span style="width:8px; height:8px; border-radius:50%; background:{_splash_dot_color}; animation:mc-pulse 1.1s infinite ease-in-out 0.36s;"></span>
-            </div>
-          </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+    _splash.markdown(_splash_html(), unsafe_allow_html=True)
 
-data = get_data()
+data_refresh_slot = int(datetime.now().timestamp()) // DATA_TTL_SECONDS
+data = get_data(data_refresh_slot)
+_prune_stale_data_pickles(data_refresh_slot)
+# mtimes des sources lus seulement en développement : aucun stat() par rerun en production.
 engine_cache_buster = (
-    int((pathlib.Path(__file__).parent / "app.py").stat().st_mtime),
-    int((pathlib.Path(__file__).parent / "query_engine.py").stat().st_mtime),
-    int((pathlib.Path(__file__).parent / "rag_engine.py").stat().st_mtime),
+    tuple(int(path.stat().st_mtime) for path in ENGINE_SOURCE_FILES)
+    if os.getenv("MC_DEV_RELOAD", "").strip() == "1"
+    else ()
 )
-rag, query_engine = get_engines(data, engine_cache_buster)
+rag, query_engine = get_engines(data, data_refresh_slot, engine_cache_buster)
 if _splash is not None:
     _splash.empty()
     st.session_state.boot_splash_done = True
@@ -1379,7 +1067,7 @@ with st.sidebar:
     </p>
     """, unsafe_allow_html=True)
 
-    if "sidebar_page" not in st.session_state or st.session_state["sidebar_page"] not in PAGE_OPTIONS:
+    if st.session_state.get("sidebar_page") not in _PAGE_SET:
         st.session_state["sidebar_page"] = st.session_state.current_page
 
     page = st.radio(
@@ -1400,7 +1088,7 @@ with st.sidebar:
     </p>
     """, unsafe_allow_html=True)
 
-    date_min, date_max = get_global_date_bounds(data)
+    date_min, date_max = data.get("date_bounds") or get_global_date_bounds(data)
     default_end = date_max
     default_start = max(date_min, default_end - timedelta(days=29))
 
@@ -1443,7 +1131,7 @@ with st.sidebar:
         if start_date > end_date:
             start_date, end_date = end_date, start_date
         st.session_state.custom_period_range = (start_date, end_date)
-        periode = f"Personnalisée : {start_date.isoformat()} -> {end_date.isoformat()}"
+        periode = f"{CUSTOM_PERIOD_PREFIX}{start_date.isoformat()}{CUSTOM_PERIOD_SEP}{end_date.isoformat()}"
         st.caption(f"Fenêtre active: {start_date.isoformat()} → {end_date.isoformat()}")
     else:
         periode = period_choice
@@ -1452,7 +1140,7 @@ with st.sidebar:
     cards = []
     for key, label in [("collisions", "Collisions QC"), ("311", "Requêtes 311"), ("stm", "STM GTFS"), ("meteo", "Météo Canada")]:
         kind, desc = data["status"].get(key, ("demo", ""))
-        dot = "#16a34a" if kind == "real" else "#ea580c"
+        dot = "var(--mc-success)" if kind == "real" else "var(--mc-warn)"
         badge = "Réel" if kind == "real" else "Démo"
         count = desc.split("(")[1].replace(")", "").strip() if "(" in desc else desc
         cards.append(
@@ -1482,13 +1170,17 @@ with st.sidebar:
         unsafe_allow_html=True,
     )
 
-# Jeu de données filtré selon la période sélectionnée (dashboard + briefing).
-data_period = dict(data)
-data_period["collisions"] = filter_df_by_period(data["collisions"], periode)
-data_period["req311"] = filter_df_by_period(data["req311"], periode)
-data_period["hotspots"] = compute_hotspots_df(data_period["collisions"])
-data_period["meteo_corr"] = compute_meteo_corr_df(data_period["collisions"])
-data_period["weekly_trend"] = compute_weekly_trend_df(data_period["collisions"], data_period["req311"])
+
+def get_data_version() -> tuple:
+    """Empreinte légère des données chargées (tranche de get_data, tailles + bornes de dates), clé des caches par période."""
+    return (data_refresh_slot, len(data["collisions"]), len(data["req311"]), data["date_bounds"])
+
+
+def get_period_data() -> dict:
+    """Jeu de données filtré selon la période sélectionnée, construit par les seules pages qui le lisent."""
+    return {**data, **build_period_views(data, periode, get_data_version())}
+
+
 weekly_briefing_files = save_weekly_briefing_snapshots(data)
 
 # ─── PAGE RENDER ──────────────────────────────────────────────────────────────
@@ -1496,20 +1188,13 @@ weekly_briefing_files = save_weekly_briefing_snapshots(data)
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE — CHAT
 # ══════════════════════════════════════════════════════════════════════════════
-if page == "Chat analytique":
+def page_chat() -> None:
     examples = [
         "Où ça coince en ce moment ?",
         "Quels quartiers ont le plus d'incidents par temps de pluie ?",
         "Quels types de requêtes 311 explosent quand il neige ?",
         "Autour de quels arrêts STM observe-t-on le plus de collisions ?"
     ]
-    
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-    if "pending_question" not in st.session_state:
-        st.session_state.pending_question = None
-    if "pending_ambiguity" not in st.session_state:
-        st.session_state.pending_ambiguity = None
 
     def _submit_question(question_text: str):
         question_text = str(question_text or "").strip()
@@ -1525,7 +1210,7 @@ if page == "Chat analytique":
             and st.session_state.pending_question is not None
         ):
             return
-        st.session_state.chat_history.append({"role": "user", "content": question_text})
+        _append_chat_message("user", question_text)
         st.session_state.pending_question = question_text
 
     def _submit_hero_input():
@@ -1563,8 +1248,9 @@ if page == "Chat analytique":
                 label_visibility="collapsed",
                 on_change=_submit_hero_input,
             )
-            if st.button("Analyser", key="hero_submit_btn", use_container_width=True):
-                _submit_hero_input()
+            # Callback : la question est en file avant le rerun, comme pour la touche Entrée, donc
+            # l'en-tête, « Effacer » et le chat_input apparaissent dès la première réponse.
+            st.button("Analyser", key="hero_submit_btn", use_container_width=True, on_click=_submit_hero_input)
 
             with st.popover("Exemples de questions", use_container_width=True):
                 for i, ex in enumerate(examples):
@@ -1590,14 +1276,12 @@ if page == "Chat analytique":
         }
         st.session_state["amb_choice_idx"] = 0
         # Nettoie les anciennes cartes d'ambiguïté qui alourdissent l'affichage.
-        st.session_state.chat_history = [
-                m for m in st.session_state.chat_history
-                if not (
-                    m.get("role") == "assistant"
-                    and "DÉTECTION D'AMBIGUÏTÉ" in str(m.get("content", ""))
-                )
-            ]
+        st.session_state.chat_history[:] = [
+            m for m in st.session_state.chat_history if m.get("kind") != "ambiguity"
+        ]
 
+    # Fragment : changer d'interprétation ne relance que la carte, pas tout l'historique.
+    @st.fragment
     def _render_pending_ambiguity():
         if not st.session_state.pending_ambiguity:
             return
@@ -1627,7 +1311,7 @@ if page == "Chat analytique":
 <span style="color:var(--mc-text); font-size:12px;">{opt}</span>
 </div>"""
                     response = query_engine.answer(refined_question, rag, periode, skip_ambiguity=True)
-                    st.session_state.chat_history.append({"role": "assistant", "content": confirm + response})
+                    _append_chat_message("assistant", confirm + response)
                     st.session_state.pending_ambiguity = None
                     st.rerun()
             with action_cols[1]:
@@ -1649,38 +1333,49 @@ if page == "Chat analytique":
         ambiguity = rag.detect_ambiguity(question_text)
         return ambiguity["is_ambiguous"], ambiguity
 
-    # Chat history en ordre chronologique (ancien -> récent).
-    history_to_show = st.session_state.chat_history
-    if history_to_show:
-        for msg in history_to_show:
-            role = str(msg.get("role", "assistant"))
-            content = str(msg.get("content", ""))
-            if role == "user":
-                st.markdown(
-                    f"""<div class="chat-user-row"><div class="chat-user-bubble">{html_lib.escape(content)}</div></div>""",
-                    unsafe_allow_html=True,
-                )
-            else:
-                with st.chat_message("assistant"):
-                    st.markdown(content, unsafe_allow_html=True)
-        # Affiche la désambiguïsation tout en bas, attachée à la dernière question.
-        if st.session_state.pending_ambiguity:
-            _render_pending_ambiguity()
-    else:
-        _render_pending_ambiguity()
-    
-    # Process pending question from buttons
-    if st.session_state.pending_question:
-        question = st.session_state.pending_question
-        st.session_state.pending_question = None
-        with st.spinner("Analyse en cours..."):
-            need_ambiguity, ambiguity = _needs_manual_ambiguity(question, periode)
+    # Fragment : afficher/masquer les anciens messages ne relance que l'historique.
+    @st.fragment
+    def _render_chat_history():
+        # Chat history en ordre chronologique (ancien -> récent).
+        history_to_show = st.session_state.chat_history
+        # Seuls les derniers échanges sont rendus à chaque rerun; les plus anciens
+        # ne sont envoyés au navigateur que sur demande.
+        older = history_to_show[:-CHAT_HISTORY_VISIBLE]
+        shown = history_to_show[-CHAT_HISTORY_VISIBLE:]
+        if older and st.toggle(
+            f"Afficher les {len(older)} messages précédents",
+            key="chat_show_older",
+        ):
+            shown = history_to_show
+        # Un élément Markdown par message : une réponse LLM mal fermée (div, bloc de code, liste)
+        # reste confinée à son élément et ne déborde pas sur les suivants.
+        for msg in shown:
+            st.markdown(_chat_message_html(msg), unsafe_allow_html=True)
+
+        # Question en attente traitée dans le fragment : la réponse écrite sur place appartient
+        # au fragment, et ses reruns la redessinent depuis l'historique au lieu de la dupliquer.
+        if st.session_state.pending_question:
+            question = st.session_state.pending_question
+            st.session_state.pending_question = None
+            # Emplacement unique : le spinner puis la réponse y sont écrits sur place,
+            # sans rerun qui re-rendrait tout l'historique.
+            answer_slot = st.empty()
+            with answer_slot.container():
+                with st.spinner("Analyse en cours..."):
+                    need_ambiguity, ambiguity = _needs_manual_ambiguity(question, periode)
+                    if not need_ambiguity:
+                        response = query_engine.answer(question, rag, periode)
             if need_ambiguity:
+                # La carte de désambiguïsation contient des widgets : rerun complet nécessaire.
                 _queue_ambiguity(question, ambiguity)
-            else:
-                response = query_engine.answer(question, rag, periode)
-                st.session_state.chat_history.append({"role": "assistant", "content": response})
-        st.rerun()
+                st.rerun(scope="app")
+            _append_chat_message("assistant", response)
+            answer_slot.markdown(_chat_message_html(st.session_state.chat_history[-1]), unsafe_allow_html=True)
+
+    if st.session_state.chat_history:
+        _render_chat_history()
+    # Affiche la désambiguïsation tout en bas, attachée à la dernière question.
+    _render_pending_ambiguity()
     
     # Chat input fixe en bas seulement après le premier échange.
     if has_messages:
@@ -1691,95 +1386,313 @@ if page == "Chat analytique":
             _submit_question(prompt)
             st.rerun()
 
+
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE — DASHBOARD
 # ══════════════════════════════════════════════════════════════════════════════
-elif page == "Dashboard":
-    # Mode compact: exploite mieux la largeur écran et réduit le scroll.
-    st.markdown(
-        """
-        <style>
-        .block-container { max-width: 1450px !important; padding-top: 1.2rem !important; padding-bottom: 3rem !important; }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+# Points max envoyés à la carte de densité (échantillon déterministe au-delà).
+# Cellules de la carte de densité : 1/2000° ≈ 55 m en latitude à Montréal. La grille est
+# grossie (x2) tant qu'elle dépasse MAP_POINTS_MAX cellules.
+MAP_CELLS_PER_DEGREE = 2000
+MAP_POINTS_MAX = 25_000
+
+# Mode compact: exploite mieux la largeur écran et réduit le scroll.
+DASHBOARD_CSS = """
+<style>
+.block-container { max-width: 1450px !important; padding-top: 1.2rem !important; padding-bottom: 3rem !important; }
+</style>
+"""
+DASHBOARD_PLOT_CONFIG = {
+    "displayModeBar": False,
+    "displaylogo": False,
+    "scrollZoom": False,
+    "responsive": True,
+}
+MAP_LEGEND_HTML = """
+<div style="display:flex; gap:10px; align-items:center; margin-top:4px; font-size:11px; color:var(--mc-text-subtle);">
+    <span style="display:inline-flex; align-items:center; gap:6px;"><span style="width:10px;height:10px;border-radius:50%;background:#dbeafe;display:inline-block;"></span>faible concentration</span>
+    <span style="display:inline-flex; align-items:center; gap:6px;"><span style="width:10px;height:10px;border-radius:50%;background:#2563eb;display:inline-block;"></span>concentration moyenne</span>
+    <span style="display:inline-flex; align-items:center; gap:6px;"><span style="width:10px;height:10px;border-radius:50%;background:#dc2626;display:inline-block;"></span>concentration élevée</span>
+</div>
+"""
 
-    collisions = data_period["collisions"].copy()
-    req311 = data_period["req311"].copy()
-    hotspots = data_period["hotspots"].copy()
-    weekly_view = data_period["weekly_trend"].copy()
-    dark_mode = st.session_state.get("ui_theme") == "Sombre"
-    plot_bg = _t["card_bg"]
-    plot_grid = "#2b3f5f" if dark_mode else "#eef2f7"
-    plot_font = _t["text3"]
-    legend_bg = "rgba(17,26,43,0.82)" if dark_mode else "rgba(255,255,255,0.85)"
-    map_style = "carto-darkmatter" if dark_mode else "carto-positron"
-    dashboard_plot_config = {
-        "displayModeBar": False,
-        "displaylogo": False,
-        "scrollZoom": False,
-        "responsive": True,
-    }
 
-    if "gravite_num" in collisions.columns:
-        grav = pd.to_numeric(collisions["gravite_num"], errors="coerce").fillna(0)
-        graves_n = int((grav >= 3).sum())
-    else:
-        graves_n = 0
-    coll_total = int(len(collisions))
-    req_total = int(len(req311))
-    grave_rate = (graves_n / coll_total * 100) if coll_total > 0 else 0.0
+def _dashboard_plot_style(ui_theme: str) -> dict:
+    """Couleurs Plotly du dashboard pour un thème."""
+    tokens = _THEME_TOKENS.get(ui_theme, _THEME_TOKENS["Clair"])
+    dark_mode = ui_theme == "Sombre"
+    return {
+        "bg": tokens["card_bg"],
+        "grid": "#2b3f5f" if dark_mode else "#eef2f7",
+        "font": tokens["text3"],
+        "legend_bg": "rgba(17,26,43,0.82)" if dark_mode else "rgba(255,255,255,0.85)",
+        "map_style": "carto-darkmatter" if dark_mode else "carto-positron",
+        "border": tokens["border"],
+        "text": tokens["text"],
+    }
 
-    top_req_label = "n/a"
-    if not req311.empty and "type_service" in req311.columns:
-        top_req_counts = req311["type_service"].fillna("Non spécifié").astype(str).value_counts()
-        if len(top_req_counts):
-            top_req_label = str(top_req_counts.index[0])
 
-    top_meteo_label = "n/a"
-    if not collisions.empty and "condition_meteo" in collisions.columns:
-        top_meteo = collisions["condition_meteo"].fillna("Inconnue").astype(str).value_counts()
-        if len(top_meteo):
-            top_meteo_label = str(top_meteo.index[0])
+def _bin_map_points(collisions: pd.DataFrame) -> pd.DataFrame:
+    """Une ligne par cellule (~55 m ou plus) : gravité sommée, position moyenne des collisions.
+
+    La densité étant une somme pondérée, le rendu reste équivalent avec bien moins de points
+    qu'un échantillon aléatoire. Coordonnées en float32 (~1 m) pour alléger le JSON.
+    """
+    lat = collisions["latitude"].to_numpy(dtype=np.float64)
+    lon = collisions["longitude"].to_numpy(dtype=np.float64)
+    z = collisions["gravite_num"].to_numpy(dtype=np.float64)
+    cells_per_degree = MAP_CELLS_PER_DEGREE
+    while True:
+        # Clé de cellule sur un seul int64 : ligne de latitude dans les 32 bits hauts, colonne dessous.
+        lat_i = np.floor(lat * cells_per_degree).astype(np.int64)
+        lon_i = np.floor(lon * cells_per_degree).astype(np.int64)
+        codes, uniques = pd.factorize((lat_i << 32) | (lon_i & 0xFFFFFFFF))
+        if len(uniques) <= MAP_POINTS_MAX or cells_per_degree <= 1:
+            break
+        cells_per_degree //= 2
+    counts = np.bincount(codes)
+    return pd.DataFrame({
+        "latitude": (np.bincount(codes, weights=lat) / counts).astype(np.float32),
+        "longitude": (np.bincount(codes, weights=lon) / counts).astype(np.float32),
+        "gravite_num": np.bincount(codes, weights=z, minlength=len(counts)),
+    })
+
+
+# Figures mises en cache par (période, thème) sous forme de dict : les reruns sans changement
+# de période ni de thème sautent toute la construction Plotly. Plotly n'est importé qu'ici.
+@st.cache_data(show_spinner=False, ttl=DATA_TTL_SECONDS)
+def build_density_map_figure(_data: dict, periode: str, data_version: tuple, ui_theme: str) -> dict:
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    style = _dashboard_plot_style(ui_theme)
+    collisions = build_period_views(_data, periode, data_version)["collisions"]
+    aggregates = build_dashboard_aggregates(_data, periode, data_version)
+
+    collisions_map = _bin_map_points(collisions)
+
+    fig_map = px.density_mapbox(
+        collisions_map,
+        lat="latitude",
+        lon="longitude",
+        z="gravite_num",
+        radius=14,
+        center={"lat": 45.531, "lon": -73.567},
+        zoom=10.4,
+        mapbox_style=style["map_style"],
+        color_continuous_scale=[(0.0, "#dbeafe"), (0.45, "#2563eb"), (1.0, "#dc2626")],
+        labels={"gravite_num": "Intensité pondérée"},
+        opacity=0.78,
+    )
 
-    if hotspots.empty:
-        insight_zone = "Aucune zone prioritaire détectée sur la période."
-    else:
-        top_h = hotspots.iloc[0]
-        zone_name = str(top_h.get("lieu", "zone principale"))
-        zone_coll = int(top_h.get("collisions", 0))
-        zone_graves = int(top_h.get("graves", 0))
-        insight_zone = f"Zone prioritaire: {zone_name} ({zone_coll} collisions, {zone_graves} graves)."
-
-    trend_line = "Tendance hebdomadaire en cours de calcul."
-    if isinstance(weekly_view, pd.DataFrame) and len(weekly_view) >= 2 and "collisions" in weekly_view.columns:
-        try:
-            c_prev = int(pd.to_numeric(weekly_view.iloc[-2]["collisions"], errors="coerce"))
-            c_last = int(pd.to_numeric(weekly_view.iloc[-1]["collisions"], errors="coerce"))
-            delta = c_last - c_prev
-            pct = (delta / c_prev * 100.0) if c_prev > 0 else 0.0
-            trend_word = "hausse" if delta > 0 else "baisse" if delta < 0 else "stabilité"
-            trend_line = f"Tendance récente: {trend_word} hebdomadaire ({delta:+d}, {pct:+.1f}%)."
-        except Exception:
-            trend_line = "Tendance hebdomadaire en cours de calcul."
+    top_pts = aggregates["top_points"]
+    if top_pts is not None:
+        fig_map.add_trace(
+            go.Scattermapbox(
+                lat=top_pts["latitude"],
+                lon=top_pts["longitude"],
+                mode="markers+text",
+                text=[f"#{i+1}" for i in range(len(top_pts))],
+                textposition="top center",
+                marker=dict(size=10, color=style["text"]),
+                hovertemplate="<b>%{customdata[0]}</b><br>%{customdata[1]} collisions<extra>Hotspot</extra>",
+                customdata=list(zip(top_pts["intersection"], top_pts["total"].tolist())),
+                name="Hotspots",
+            )
+        )
 
-    st.markdown(
-        f"""
-        <div style="background:var(--mc-surface); border:1px solid var(--mc-border); border-left:4px solid var(--mc-accent); border-radius:12px; padding:12px 14px; margin-bottom:10px;">
-          <div style="font-family:'Geist Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.08em; margin-bottom:6px; text-transform:uppercase;">Insight principal</div>
-          <div style="font-size:15px; color:var(--mc-text); line-height:1.6; font-weight:600; margin-bottom:4px;">{insight_zone}</div>
-          <div style="font-size:12px; color:var(--mc-text-muted); line-height:1.6;">{trend_line} Contexte dominant observé: <strong>{top_meteo_label}</strong>.</div>
-        </div>
-        """,
-        unsafe_allow_html=True,
+    fig_map.update_layout(
+        height=345,
+        margin=dict(l=0, r=0, t=0, b=0),
+        paper_bgcolor=style["bg"],
+        font=dict(color=style["font"], size=10),
+        coloraxis_colorbar=dict(
+            title=dict(text="Intensité", font=dict(size=10)),
+            tickfont=dict(size=9),
+            thickness=12,
+            len=0.52,
+        ),
+        legend=dict(
+            orientation="h",
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=0.01,
+            bgcolor=style["legend_bg"],
+            bordercolor=style["border"],
+            borderwidth=1,
+            font=dict(size=9),
+        ),
+    )
+    return fig_map.to_dict()
+
+
+@st.cache_data(show_spinner=False, ttl=DATA_TTL_SECONDS)
+def build_req311_figure(_data: dict, periode: str, data_version: tuple, ui_theme: str) -> dict:
+    import plotly.graph_objects as go
+
+    style = _dashboard_plot_style(ui_theme)
+    req_df = build_dashboard_aggregates(_data, periode, data_version)["req_types"]
+    req_df["pct"] = (req_df["total"] / max(req_df["total"].sum(), 1) * 100).round(1)
+    req_df = req_df.sort_values("total", ascending=True)
+
+    fig_311 = go.Figure(
+        go.Bar(
+            x=req_df["total"],
+            y=req_df["type_service"],
+            orientation="h",
+            marker=dict(color="#2563eb"),
+            text=[f"{v} ({p}%)" for v, p in zip(req_df["total"], req_df["pct"])],
+            textposition="outside",
+            cliponaxis=False,
+            hovertemplate="<b>%{y}</b><br>%{x} requêtes<extra></extra>",
+        )
+    )
+    fig_311.update_layout(
+        height=250,
+        margin=dict(l=0, r=30, t=0, b=0),
+        paper_bgcolor=style["bg"],
+        plot_bgcolor=style["bg"],
+        font=dict(family="IBM Plex Mono", color=style["font"], size=10),
+        xaxis=dict(title="Nb requêtes", gridcolor=style["grid"]),
+        yaxis=dict(title=""),
+    )
+    return fig_311.to_dict()
+
+
+@st.cache_data(show_spinner=False, ttl=DATA_TTL_SECONDS)
+def build_weather_figure(_data: dict, periode: str, data_version: tuple, ui_theme: str) -> dict:
+    import plotly.graph_objects as go
+
+    style = _dashboard_plot_style(ui_theme)
+    met_df = build_dashboard_aggregates(_data, periode, data_version)["weather"]
+
+    fig_weather = go.Figure(
+        go.Bar(
+            x=met_df["collisions"],
+            y=met_df["condition_meteo"],
+            orientation="h",
+            marker=dict(
+                color=met_df["taux_graves"],
+                colorscale=[[0, "#dbeafe"], [1, "#dc2626"]],
+                colorbar=dict(title="% graves", thickness=9),
+            ),
+            text=[f"{v} · {t}%" for v, t in zip(met_df["collisions"], met_df["taux_graves"])],
+            textposition="outside",
+            cliponaxis=False,
+            hovertemplate="<b>%{y}</b><br>%{x} collisions<br>%{marker.color}% graves<extra></extra>",
+        )
     )
+    fig_weather.update_layout(
+        height=250,
+        margin=dict(l=0, r=30, t=0, b=0),
+        paper_bgcolor=style["bg"],
+        plot_bgcolor=style["bg"],
+        font=dict(family="IBM Plex Mono", color=style["font"], size=10),
+        xaxis=dict(title="Nb collisions", gridcolor=style["grid"]),
+        yaxis=dict(title=""),
+    )
+    return fig_weather.to_dict()
+
+
+@st.cache_data(show_spinner=False, ttl=DATA_TTL_SECONDS)
+def build_weekly_trend_figure(_data: dict, periode: str, data_version: tuple, ui_theme: str) -> dict:
+    import plotly.graph_objects as go
+
+    style = _dashboard_plot_style(ui_theme)
+    weekly = build_period_views(_data, periode, data_version)["weekly_trend"]
+    tick_step = 1 if len(weekly) <= 8 else 2
+    tick_vals = weekly["semaine_label"].iloc[::tick_step].tolist()
+    coll_series = pd.to_numeric(weekly["collisions"], errors="coerce").fillna(0)
+    y1_cfg = dict(
+        title="Collisions",
+        gridcolor=style["grid"],
+        zeroline=False,
+        rangemode="tozero",
+    )
+    if coll_series.max() <= 0:
+        y1_cfg.update(range=[0, 1], dtick=1)
+
+    fig_trend = go.Figure()
+    fig_trend.add_trace(
+        go.Scatter(
+            x=weekly["semaine_label"],
+            y=weekly["collisions"],
+            name="Collisions",
+            line=dict(color="#dc2626", width=2.2),
+            mode="lines+markers",
+            yaxis="y",
+            hovertemplate="Semaine %{x}<br>Collisions: %{y}<extra></extra>",
+        )
+    )
+    fig_trend.add_trace(
+        go.Scatter(
+            x=weekly["semaine_label"],
+            y=weekly["req311"],
+            name="Requêtes 311",
+            line=dict(color="#2563eb", width=2.2),
+            mode="lines+markers",
+            yaxis="y2",
+            hovertemplate="Semaine %{x}<br>Req. 311: %{y}<extra></extra>",
+        )
+    )
+    fig_trend.update_layout(
+        height=250,
+        margin=dict(l=0, r=0, t=0, b=0),
+        paper_bgcolor=style["bg"],
+        plot_bgcolor=style["bg"],
+        font=dict(family="IBM Plex Mono", color=style["font"], size=10),
+        hovermode="x unified",
+        xaxis=dict(
+            gridcolor=style["grid"],
+            tickmode="array",
+            tickvals=tick_vals,
+            ticktext=tick_vals,
+            tickangle=-32,
+            tickfont=dict(size=9),
+            automargin=True,
+        ),
+        yaxis=y1_cfg,
+        yaxis2=dict(
+            title="Req. 311",
+            overlaying="y",
+            side="right",
+            showgrid=False,
+            zeroline=False,
+            rangemode="tozero",
+            tickformat=",.0f",
+        ),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="left",
+            x=0,
+            bgcolor=style["legend_bg"],
+            bordercolor=style["border"],
+            borderwidth=1,
+            font=dict(size=9),
+        ),
+    )
+    return fig_trend.to_dict()
+
+
+def page_dashboard() -> None:
+    data_period = get_period_data()
+
+    st.markdown(DASHBOARD_CSS, unsafe_allow_html=True)
+
+    collisions = data_period["collisions"]
+    hotspots = data_period["hotspots"]
+    weekly_view = data_period["weekly_trend"]
 
-    k1, k2, k3, k4 = st.columns(4)
-    k1.metric("Collisions", f"{coll_total:,}".replace(",", " "))
-    k2.metric("Collisions graves", f"{graves_n:,}".replace(",", " "), f"{grave_rate:.1f}% du total")
-    k3.metric("Requêtes 311", f"{req_total:,}".replace(",", " "))
-    k4.metric("Contexte dominant", top_meteo_label if top_meteo_label else "n/a", top_req_label[:22])
+    data_version = get_data_version()
+    aggregates = build_dashboard_aggregates(data, periode, data_version)
+    figure_args = (data, periode, data_version, st.session_state.get("ui_theme", "Clair"))
+
+    st.markdown(aggregates["insight_html"], unsafe_allow_html=True)
+
+    st.markdown(aggregates["kpi_html"], unsafe_allow_html=True)
 
     with st.expander("Contexte et méthode de lecture (secondaire)", expanded=False):
         st.markdown(
@@ -1800,151 +1713,27 @@ elif page == "Dashboard":
         if collisions.empty:
             st.info("Aucune collision disponible sur cette période.")
         else:
-            collisions_map = collisions.copy()
-            if len(collisions_map) > 25_000:
-                collisions_map = collisions_map.sample(25_000, random_state=42)
-
-            fig_map = px.density_mapbox(
-                collisions_map,
-                lat="latitude",
-                lon="longitude",
-                z="gravite_num",
-                radius=14,
-                center={"lat": 45.531, "lon": -73.567},
-                zoom=10.4,
-                mapbox_style=map_style,
-                color_continuous_scale=[(0.0, "#dbeafe"), (0.45, "#2563eb"), (1.0, "#dc2626")],
-                labels={"gravite_num": "Intensité pondérée"},
-                opacity=0.78,
-            )
+            st.plotly_chart(build_density_map_figure(*figure_args), use_container_width=True, config=DASHBOARD_PLOT_CONFIG)
 
-            if {"intersection", "latitude", "longitude"}.issubset(collisions.columns):
-                top_pts = (
-                    collisions.groupby("intersection")
-                    .agg(
-                        total=("gravite_num", "count"),
-                        latitude=("latitude", "mean"),
-                        longitude=("longitude", "mean"),
-                    )
-                    .sort_values("total", ascending=False)
-                    .head(5)
-                    .reset_index()
-                )
-                fig_map.add_trace(
-                    go.Scattermapbox(
-                        lat=top_pts["latitude"],
-                        lon=top_pts["longitude"],
-                        mode="markers+text",
-                        text=[f"#{i+1}" for i in range(len(top_pts))],
-                        textposition="top center",
-                        marker=dict(size=10, color=_t["text"]),
-                        hovertemplate="<b>%{customdata[0]}</b><br>%{customdata[1]} collisions<extra>Hotspot</extra>",
-                        customdata=np.column_stack([top_pts["intersection"], top_pts["total"]]),
-                        name="Hotspots",
-                    )
-                )
-
-            fig_map.update_layout(
-                height=345,
-                margin=dict(l=0, r=0, t=0, b=0),
-                paper_bgcolor=plot_bg,
-                font=dict(color=plot_font, size=10),
-                coloraxis_colorbar=dict(
-                    title=dict(text="Intensité", font=dict(size=10)),
-                    tickfont=dict(size=9),
-                    thickness=12,
-                    len=0.52,
-                ),
-                legend=dict(
-                    orientation="h",
-                    yanchor="top",
-                    y=0.99,
-                    xanchor="left",
-                    x=0.01,
-                    bgcolor=legend_bg,
-                    bordercolor=_t["border"],
-                    borderwidth=1,
-                    font=dict(size=9),
-                ),
-            )
-            st.plotly_chart(fig_map, use_container_width=True, config=dashboard_plot_config)
-
-            st.markdown(
-                """
-                <div style="display:flex; gap:10px; align-items:center; margin-top:4px; font-size:11px; color:var(--mc-text-subtle);">
-                    <span style="display:inline-flex; align-items:center; gap:6px;"><span style="width:10px;height:10px;border-radius:50%;background:#dbeafe;display:inline-block;"></span>faible concentration</span>
-                    <span style="display:inline-flex; align-items:center; gap:6px;"><span style="width:10px;height:10px;border-radius:50%;background:#2563eb;display:inline-block;"></span>concentration moyenne</span>
-                    <span style="display:inline-flex; align-items:center; gap:6px;"><span style="width:10px;height:10px;border-radius:50%;background:#dc2626;display:inline-block;"></span>concentration élevée</span>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
+            st.markdown(MAP_LEGEND_HTML, unsafe_allow_html=True)
 
     with col_right:
         st.markdown("""<div style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.1em; font-weight:600; text-transform:uppercase; margin-bottom:10px;">Top 5 zones à surveiller</div>""", unsafe_allow_html=True)
         if hotspots.empty:
             st.info("Aucun hotspot détecté sur cette période.")
         else:
-            for i, row in hotspots.iterrows():
-                total = int(row.get("collisions", 0))
-                graves = int(row.get("graves", 0))
-                h = row.get("heure_moyenne", np.nan)
-                if pd.isna(h):
-                    h_txt = "heure inconnue"
-                else:
-                    h_val = int(round(float(h)))
-                    h_txt = f"pic vers {h_val}h"
-                severity_color = "#dc2626" if total >= 25 else "#d97706" if total >= 15 else "#2563eb"
-                place = str(row.get("lieu", f"Zone {i+1}"))
-                st.markdown(
-                    f"""
-                    <div style="background:var(--mc-card-bg); border:1px solid var(--mc-border); border-left:4px solid {severity_color}; border-radius:10px; padding:8px 10px; margin-bottom:6px;">
-                        <div style="display:flex; justify-content:space-between; align-items:center;">
-                            <span style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.08em;">ZONE #{i+1}</span>
-                            <span style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:{severity_color};">{total} collisions</span>
-                        </div>
-                        <div style="font-size:12px; font-weight:600; color:var(--mc-text); margin:3px 0 4px 0;">{place}</div>
-                        <div style="font-size:11px; color:var(--mc-text-muted);">{graves} graves · {h_txt}</div>
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
+            for card_html in aggregates["hotspot_cards"]:
+                st.markdown(card_html, unsafe_allow_html=True)
             st.caption("Les repères #1..#5 sont affichés sur la carte pour relier visuellement la zone et son détail.")
 
     with st.expander("Détails analytiques secondaires (311, météo, tendances)", expanded=False):
         col_a, col_b, col_c = st.columns(3, gap="large")
         with col_a:
             st.markdown("""<div style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.1em; font-weight:600; text-transform:uppercase; margin-bottom:8px;">Requêtes 311 par type</div>""", unsafe_allow_html=True)
-            if req311.empty or "type_service" not in req311.columns:
+            if aggregates["req_types"] is None:
                 st.info("Aucune requête 311 sur cette période.")
             else:
-                req_counts = req311["type_service"].fillna("Non spécifié").astype(str).value_counts().head(8)
-                req_df = req_counts.rename_axis("type_service").reset_index(name="total")
-                req_df["pct"] = (req_df["total"] / max(req_df["total"].sum(), 1) * 100).round(1)
-                req_df = req_df.sort_values("total", ascending=True)
-
-                fig_311 = go.Figure(
-                    go.Bar(
-                        x=req_df["total"],
-                        y=req_df["type_service"],
-                        orientation="h",
-                        marker=dict(color="#2563eb"),
-                        text=[f"{v} ({p}%)" for v, p in zip(req_df["total"], req_df["pct"])],
-                        textposition="outside",
-                        cliponaxis=False,
-                        hovertemplate="<b>%{y}</b><br>%{x} requêtes<extra></extra>",
-                    )
-                )
-                fig_311.update_layout(
-                    height=250,
-                    margin=dict(l=0, r=30, t=0, b=0),
-                    paper_bgcolor=plot_bg,
-                    plot_bgcolor=plot_bg,
-                    font=dict(family="IBM Plex Mono", color=plot_font, size=10),
-                    xaxis=dict(title="Nb requêtes", gridcolor=plot_grid),
-                    yaxis=dict(title=""),
-                )
-                st.plotly_chart(fig_311, use_container_width=True, config=dashboard_plot_config)
+                st.plotly_chart(build_req311_figure(*figure_args), use_container_width=True, config=DASHBOARD_PLOT_CONFIG)
 
         with col_b:
             st.markdown("""<div style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.1em; font-weight:600; text-transform:uppercase; margin-bottom:8px;">Collisions par condition météo</div>""", unsafe_allow_html=True)
@@ -1954,298 +1743,119 @@ Corrélation observée - causalité non démontrée. Analyse basée sur des volu
 </div>""",
                 unsafe_allow_html=True,
             )
-            if collisions.empty or "condition_meteo" not in collisions.columns:
+            if aggregates["weather"] is None:
                 st.info("Pas assez de données météo/collisions sur cette période.")
             else:
-                met = collisions.copy()
-                met["condition_meteo"] = met["condition_meteo"].fillna("Inconnue").astype(str)
-                met["gravite_num"] = pd.to_numeric(met.get("gravite_num"), errors="coerce").fillna(0)
-                met_df = (
-                    met.groupby("condition_meteo")
-                    .agg(
-                        collisions=("gravite_num", "count"),
-                        taux_graves=("gravite_num", lambda x: round(((x >= 3).sum() / max(len(x), 1)) * 100, 1)),
-                    )
-                    .sort_values("collisions", ascending=False)
-                    .head(8)
-                    .sort_values("collisions", ascending=True)
-                    .reset_index()
-                )
-
-                fig_weather = go.Figure(
-                    go.Bar(
-                        x=met_df["collisions"],
-                        y=met_df["condition_meteo"],
-                        orientation="h",
-                        marker=dict(
-                            color=met_df["taux_graves"],
-                            colorscale=[[0, "#dbeafe"], [1, "#dc2626"]],
-                            colorbar=dict(title="% graves", thickness=9),
-                        ),
-                        text=[f"{v} · {t}%" for v, t in zip(met_df["collisions"], met_df["taux_graves"])],
-                        textposition="outside",
-                        cliponaxis=False,
-                        hovertemplate="<b>%{y}</b><br>%{x} collisions<br>%{marker.color}% graves<extra></extra>",
-                    )
-                )
-                fig_weather.update_layout(
-                    height=250,
-                    margin=dict(l=0, r=30, t=0, b=0),
-                    paper_bgcolor=plot_bg,
-                    plot_bgcolor=plot_bg,
-                    font=dict(family="IBM Plex Mono", color=plot_font, size=10),
-                    xaxis=dict(title="Nb collisions", gridcolor=plot_grid),
-                    yaxis=dict(title=""),
-                )
-                st.plotly_chart(fig_weather, use_container_width=True, config=dashboard_plot_config)
+                st.plotly_chart(build_weather_figure(*figure_args), use_container_width=True, config=DASHBOARD_PLOT_CONFIG)
 
         with col_c:
             st.markdown("""<div style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.1em; font-weight:600; text-transform:uppercase; margin-bottom:8px;">Tendances hebdomadaires</div>""", unsafe_allow_html=True)
-            weekly = data_period["weekly_trend"]
-            if weekly.empty:
+            if weekly_view.empty:
                 st.info("Aucune tendance hebdomadaire calculable.")
             else:
-                weekly = weekly.copy()
-                weekly["semaine_label"] = (
-                    weekly["semaine"].astype(str).str.replace("\n", " ", regex=False)
-                )
-                tick_step = 1 if len(weekly) <= 8 else 2
-                tick_vals = weekly["semaine_label"].iloc[::tick_step].tolist()
-                coll_series = pd.to_numeric(weekly["collisions"], errors="coerce").fillna(0)
-                y1_cfg = dict(
-                    title="Collisions",
-                    gridcolor=plot_grid,
-                    zeroline=False,
-                    rangemode="tozero",
-                )
-                if coll_series.max() <= 0:
-                    y1_cfg.update(range=[0, 1], dtick=1)
-
-                fig_trend = go.Figure()
-                fig_trend.add_trace(
-                    go.Scatter(
-                        x=weekly["semaine_label"],
-                        y=weekly["collisions"],
-                        name="Collisions",
-                        line=dict(color="#dc2626", width=2.2),
-                        mode="lines+markers",
-                        yaxis="y",
-                        hovertemplate="Semaine %{x}<br>Collisions: %{y}<extra></extra>",
-                    )
-                )
-                fig_trend.add_trace(
-                    go.Scatter(
-                        x=weekly["semaine_label"],
-                        y=weekly["req311"],
-                        name="Requêtes 311",
-                        line=dict(color="#2563eb", width=2.2),
-                        mode="lines+markers",
-                        yaxis="y2",
-                        hovertemplate="Semaine %{x}<br>Req. 311: %{y}<extra></extra>",
-                    )
-                )
-                fig_trend.update_layout(
-                    height=250,
-                    margin=dict(l=0, r=0, t=0, b=0),
-                    paper_bgcolor=plot_bg,
-                    plot_bgcolor=plot_bg,
-                    font=dict(family="IBM Plex Mono", color=plot_font, size=10),
-                    hovermode="x unified",
-                    xaxis=dict(
-                        gridcolor=plot_grid,
-                        tickmode="array",
-                        tickvals=tick_vals,
-                        ticktext=tick_vals,
-                        tickangle=-32,
-                        tickfont=dict(size=9),
-                        automargin=True,
-                    ),
-                    yaxis=y1_cfg,
-                    yaxis2=dict(
-                        title="Req. 311",
-                        overlaying="y",
-                        side="right",
-                        showgrid=False,
-                        zeroline=False,
-                        rangemode="tozero",
-                        tickformat=",.0f",
-                    ),
-                    legend=dict(
-                        orientation="h",
-                        yanchor="bottom",
-                        y=1.02,
-                        xanchor="left",
-                        x=0,
-                        bgcolor=legend_bg,
-                        bordercolor=_t["border"],
-                        borderwidth=1,
-                        font=dict(size=9),
-                    ),
-                )
-                st.plotly_chart(fig_trend, use_container_width=True, config=dashboard_plot_config)
+                st.plotly_chart(build_weekly_trend_figure(*figure_args), use_container_width=True, config=DASHBOARD_PLOT_CONFIG)
+
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE — BRIEFING
 # ══════════════════════════════════════════════════════════════════════════════
-elif page == "Briefing":
-    if "briefing_mode_selector" not in st.session_state:
-        st.session_state.briefing_mode_selector = "Grand public"
-    if st.session_state.briefing_mode_selector not in {"Municipalité", "Grand public"}:
-        st.session_state.briefing_mode_selector = "Grand public"
+# Styles du sélecteur de mode, du bandeau et du cadre : section « Briefing » de static/app.css,
+# chargée une fois par session navigateur avec le reste de la feuille de style.
+# Le rendu de la page est du HTML pur : st.html évite le passage par le moteur Markdown.
+BRIEFING_KICKER_HTML = """<div class="briefing-kicker">Briefing automatique (période sélectionnée)</div>"""
+
+
+# Le sélecteur stocke directement le ton ; seul le libellé affiché est en français.
+BRIEFING_MODE_LABELS = MappingProxyType({"municipal": "Municipalité", "public": "Grand public"})
+# Présentation des deux modes de lecture : (classe CSS, titre, sous-titre) par ton.
+BRIEFING_MODES = MappingProxyType({
+    "municipal": (
+        "is-municipal",
+        "Lecture opérationnelle — Municipalité",
+        "Indicateurs techniques, niveaux de gravité, priorisation d’actions terrain.",
+    ),
+    "public": (
+        "is-public",
+        "Lecture pédagogique — Grand public",
+        "Explications claires, zones de vigilance et gestes concrets pour les citoyens.",
+    ),
+})
+
+
+BRIEFING_BANNER_HTML = """
+<div class="briefing-mode-banner {mode_class}">
+    <div class="kicker">Mode actif</div>
+    <div class="title">{title}</div>
+    <div class="subtitle">{subtitle}</div>
+</div>
+"""
+BRIEFING_SHELL_HTML = """{banner}<div class="mc-briefing-shell {mode_class}">{content}</div>"""
 
-    st.markdown(
-        """
-<style>
-.st-key-briefing_mode_selector [data-testid="stRadio"] > div[role="radiogroup"] {
-    display: grid !important;
-    grid-template-columns: repeat(2, minmax(0, 1fr)) !important;
-    gap: 10px !important;
-    max-width: 760px !important;
-    margin: 0 0 12px 0 !important;
-}
-.st-key-briefing_mode_selector [data-testid="stRadio"] label {
-    margin: 0 !important;
-    padding: 12px 14px !important;
-    border-radius: 12px !important;
-    border: 1px solid var(--mc-border) !important;
-    background: var(--mc-card-bg) !important;
-    transition: border-color 180ms ease, box-shadow 180ms ease, transform 180ms ease, background 180ms ease !important;
-}
-.st-key-briefing_mode_selector [data-testid="stRadio"] label:hover {
-    transform: translateY(-1px) !important;
-}
-.st-key-briefing_mode_selector [data-testid="stRadio"] label:nth-of-type(1) {
-    --mode-accent: #2563eb;
-    --mode-surface: color-mix(in srgb, #2563eb 14%, var(--mc-card-bg) 86%);
-}
-.st-key-briefing_mode_selector [data-testid="stRadio"] label:nth-of-type(2) {
-    --mode-accent: #16a34a;
-    --mode-surface: color-mix(in srgb, #16a34a 14%, var(--mc-card-bg) 86%);
-}
-.st-key-briefing_mode_selector [data-testid="stRadio"] label:has(input:checked) {
-    border-color: var(--mode-accent) !important;
-    background: var(--mode-surface) !important;
-    box-shadow: 0 8px 22px color-mix(in srgb, var(--mode-accent) 22%, transparent) !important;
-}
-.st-key-briefing_mode_selector [data-testid="stRadio"] label > div:first-child {
-    margin-right: 10px !important;
-}
-.st-key-briefing_mode_selector [data-testid="stRadio"] label > div:first-child [type="radio"] {
-    accent-color: var(--mode-accent) !important;
-}
-.st-key-briefing_mode_selector [data-testid="stRadio"] label p {
-    font-family: var(--font) !important;
-    font-size: 15px !important;
-    font-weight: 600 !important;
-    color: var(--mc-text) !important;
-    letter-spacing: -0.01em !important;
-}
-.briefing-mode-banner {
-    border: 1px solid var(--mc-border);
-    border-left-width: 4px;
-    border-radius: 12px;
-    background: var(--mc-surface);
-    padding: 10px 12px;
-    margin: 6px 0 14px 0;
-}
-.briefing-mode-banner .kicker {
-    font-family: var(--font-mono);
-    font-size: 10px;
-    letter-spacing: 0.09em;
-    text-transform: uppercase;
-    color: var(--mc-text-subtle);
-    margin-bottom: 4px;
-}
-.briefing-mode-banner .title {
-    font-family: var(--font);
-    font-size: 14px;
-    font-weight: 600;
-    color: var(--mc-text);
-    margin-bottom: 2px;
-}
-.briefing-mode-banner .subtitle {
-    font-family: var(--font);
-    font-size: 12px;
-    color: var(--mc-text-muted);
-}
-.briefing-mode-banner.is-municipal {
-    border-left-color: #2563eb;
-    background: color-mix(in srgb, #2563eb 10%, var(--mc-card-bg) 90%);
-}
-.briefing-mode-banner.is-public {
-    border-left-color: #16a34a;
-    background: color-mix(in srgb, #16a34a 10%, var(--mc-card-bg) 90%);
-}
-.mc-briefing-shell {
-    border: 1px solid var(--mc-border);
-    border-radius: 18px;
-    padding: 12px;
-}
-.mc-briefing-shell.is-municipal {
-    background: linear-gradient(180deg, color-mix(in srgb, #2563eb 10%, transparent) 0%, transparent 52%);
-}
-.mc-briefing-shell.is-public {
-    background: linear-gradient(180deg, color-mix(in srgb, #16a34a 10%, transparent) 0%, transparent 52%);
-}
-body:has(.mc-briefing-shell.is-municipal) [data-testid="stAppViewContainer"] .main .block-container {
-    background: linear-gradient(180deg, color-mix(in srgb, #2563eb 5%, var(--bg) 95%) 0%, var(--bg) 46%) !important;
-}
-body:has(.mc-briefing-shell.is-public) [data-testid="stAppViewContainer"] .main .block-container {
-    background: linear-gradient(180deg, color-mix(in srgb, #16a34a 5%, var(--bg) 95%) 0%, var(--bg) 46%) !important;
-}
-@media (max-width: 820px) {
-    .st-key-briefing_mode_selector [data-testid="stRadio"] > div[role="radiogroup"] {
-        grid-template-columns: 1fr !important;
-        max-width: 100% !important;
-    }
-}
-</style>
-        """,
-        unsafe_allow_html=True,
-    )
+# Bandeau « Mode actif » : deux valeurs possibles, rendues une fois à l'import.
+BRIEFING_BANNERS = MappingProxyType({
+    tone: BRIEFING_BANNER_HTML.format(mode_class=mode_class, title=title, subtitle=subtitle)
+    for tone, (mode_class, title, subtitle) in BRIEFING_MODES.items()
+})
 
-    st.markdown(
-        """<div style="font-family:'IBM Plex Mono',monospace; font-size:10px; color:var(--mc-text-subtle); letter-spacing:0.08em; text-transform:uppercase; margin-bottom:10px;">Briefing automatique (période sélectionnée)</div>""",
-        unsafe_allow_html=True,
-    )
 
-    view_label = st.radio(
-        "Mode de lecture briefing",
-        options=["Municipalité", "Grand public"],
-        key="briefing_mode_selector",
-        horizontal=True,
-        label_visibility="collapsed",
-    )
-    tone = "municipal" if view_label == "Municipalité" else "public"
-    mode_class = "is-municipal" if tone == "municipal" else "is-public"
-    mode_title = (
-        "Lecture opérationnelle — Municipalité"
-        if tone == "municipal"
-        else "Lecture pédagogique — Grand public"
-    )
-    mode_subtitle = (
-        "Indicateurs techniques, niveaux de gravité, priorisation d’actions terrain."
-        if tone == "municipal"
-        else "Explications claires, zones de vigilance et gestes concrets pour les citoyens."
-    )
-    st.markdown(
-        f"""
-        <div class="briefing-mode-banner {mode_class}">
-            <div class="kicker">Mode actif</div>
-            <div class="title">{mode_title}</div>
-            <div class="subtitle">{mode_subtitle}</div>
-        </div>
-        """,
-        unsafe_allow_html=True,
+@st.cache_data(show_spinner="Génération du briefing en cours...", ttl=DATA_TTL_SECONDS)
+def build_briefing_html(_data: dict, periode: str, data_version: tuple, tone: str) -> str:
+    """Briefing HTML par (période, ton) : un rerun sans changement ne relance pas la génération."""
+    from briefing import generate_briefing
+
+    return generate_briefing(
+        {**_data, **build_period_views(_data, periode, data_version)},
+        tone=tone,
+        periode=periode,
+        reference_data=_data,
     )
 
-    with st.spinner("Génération du briefing en cours..."):
-        briefing_content = generate_briefing(
-            data_period,
-            tone=tone,
-            periode=periode,
-            reference_data=data,
+
+def page_briefing() -> None:
+    if st.session_state.get("briefing_mode_selector") not in BRIEFING_MODES:
+        st.session_state.briefing_mode_selector = "public"
+
+    st.html(BRIEFING_KICKER_HTML)
+
+    # Changer de mode ne relance que ce fragment : ni la sidebar, ni l'en-tête, ni les snapshots.
+    @st.fragment
+    def _render_briefing():
+        tone = st.radio(
+            "Mode de lecture briefing",
+            options=tuple(BRIEFING_MODE_LABELS),
+            format_func=BRIEFING_MODE_LABELS.__getitem__,
+            key="briefing_mode_selector",
+            horizontal=True,
+            label_visibility="collapsed",
         )
-    st.markdown(f"""<div class="mc-briefing-shell {mode_class}">{briefing_content}</div>""", unsafe_allow_html=True)
-    files_txt = " · ".join([str(p.name) for p in weekly_briefing_files])
-    st.caption(f"Snapshots hebdo auto générés: {files_txt}")
+        mode_class = BRIEFING_MODES[tone][0]
+
+        # Dernier rendu gardé en session avec sa clé : un rerun sans changement de période, de
+        # données ni de ton ne repasse même pas par le cache (ni hachage, ni copie du HTML).
+        # Bandeau et briefing forment un seul élément.
+        render_key = (periode, get_data_version(), tone)
+        rendered = st.session_state.briefing_render
+        if rendered is None or rendered[0] != render_key:
+            briefing_content = build_briefing_html(data, *render_key)
+            rendered = (
+                render_key,
+                BRIEFING_SHELL_HTML.format(banner=BRIEFING_BANNERS[tone], mode_class=mode_class, content=briefing_content),
+            )
+            st.session_state.briefing_render = rendered
+        st.html(rendered[1])
+
+    _render_briefing()
+    if weekly_briefing_files:
+        files_txt = " · ".join(p.name for p in weekly_briefing_files)
+        st.caption(f"Snapshots hebdo auto générés: {files_txt}")
+    else:
+        st.caption("Snapshots hebdo pas encore disponibles.")
+
+
+# Un seul rendu de page par rerun: les deux autres pages ne construisent aucun widget.
+PAGE_RENDERERS = {
+    "Chat analytique": page_chat,
+    "Dashboard": page_dashboard,
+    "Briefing": page_briefing,
+}
+PAGE_RENDERERS[page]()
@@ -6,13 +6,12 @@ Briefing hebdomadaire data-driven (municipalite / grand public).
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from decimal import Decimal, InvalidOperation, getcontext
+import functools
 import re
+from types import MappingProxyType
 import pandas as pd
 import numpy as np
 
-getcontext().prec = 28
-
 
 C = {
     "bg": "var(--mc-card-bg)",
@@ -34,6 +33,10 @@ C = {
 }
 
 HOTSPOT_311_REGEX = r"nid|deneig|déneig|eclair|éclair"
+HOTSPOT_311_RE = re.compile(HOTSPOT_311_REGEX, re.IGNORECASE)
+PERIOD_CUSTOM_RE = re.compile(
+    r"Personnalisée\s*:\s*(\d{4}-\d{2}-\d{2})\s*(?:->|→)\s*(\d{4}-\d{2}-\d{2})", re.IGNORECASE
+)
 PERIOD_TO_DAYS = {
     "7 derniers jours": 7,
     "30 derniers jours": 30,
@@ -42,43 +45,167 @@ PERIOD_TO_DAYS = {
 }
 
 
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCT_RE = re.compile(r"\s*([{};:,>])\s*")
+
+
+def _minify_css(css: str) -> str:
+    """Commentaires, espaces et derniers ';' retirés : le <style> est inclus dans chaque briefing."""
+    css = _CSS_COMMENT_RE.sub("", css)
+    css = _CSS_PUNCT_RE.sub(r"\1", _CSS_SPACE_RE.sub(" ", css))
+    return css.replace(";}", "}").strip()
+
+
+# Mise en page des accordéons et grilles : ne dépend que de la palette, figée à l'import.
+LAYOUT_CSS = _minify_css(f"""
+<style>
+.brief-accordion {{
+  border:1px solid {C['border']};
+  border-radius:12px;
+  background:{C['bg']};
+  margin:0 0 14px 0;
+  overflow:hidden;
+}}
+.brief-accordion > summary {{
+  list-style:none;
+  cursor:pointer;
+  display:flex;
+  align-items:center;
+  justify-content:space-between;
+  gap:10px;
+  padding:11px 14px;
+  background:{C['bg']};
+  border-bottom:1px solid transparent;
+  transition:background 160ms ease, border-color 160ms ease;
+}}
+.brief-accordion > summary::-webkit-details-marker {{
+  display:none;
+}}
+.brief-accordion > summary::after {{
+  content:"+";
+  font-family:{C['mono']};
+  font-size:14px;
+  color:{C['text3']};
+  line-height:1;
+}}
+.brief-accordion[open] > summary {{
+  border-bottom-color:{C['border']};
+  background:{C['subtle']};
+}}
+.brief-accordion[open] > summary::after {{
+  content:"−";
+  color:{C['text2']};
+}}
+.brief-acc-title {{
+  font-family:{C['mono']};
+  font-size:11px;
+  font-weight:600;
+  color:{C['text2']};
+  letter-spacing:0.08em;
+  text-transform:uppercase;
+}}
+.brief-accordion-body {{
+  padding:14px 14px 12px 14px;
+  background:{C['bg']};
+}}
+.brief-top-grid {{
+  display:grid;
+  grid-template-columns: minmax(0, 1.6fr) minmax(0, 1fr);
+  gap:12px;
+  align-items:start;
+}}
+.brief-bottom-grid {{
+  display:grid;
+  grid-template-columns: repeat(2, minmax(0, 1fr));
+  gap:12px;
+  align-items:start;
+}}
+.brief-zone-grid {{
+  display:grid;
+  grid-template-columns: repeat(2, minmax(0, 1fr));
+  gap:10px;
+}}
+.brief-reco-grid {{
+  display:grid;
+  grid-template-columns: repeat(2, minmax(0, 1fr));
+  gap:10px;
+}}
+.brief-decision-grid {{
+  display:grid;
+  grid-template-columns: repeat(2, minmax(0, 1fr));
+  gap:10px;
+}}
+@media (max-width: 980px) {{
+  .brief-top-grid,
+  .brief-bottom-grid,
+  .brief-zone-grid,
+  .brief-reco-grid,
+  .brief-decision-grid {{
+    grid-template-columns: 1fr !important;
+  }}
+  .brief-accordion > summary {{
+    flex-direction:column;
+    align-items:flex-start;
+  }}
+  .brief-zone-grid > div {{
+    grid-column: auto !important;
+  }}
+}}
+</style>
+""")
+
+
+# Gabarits des blocs répétés : les couleurs de C sont figées à l'import, seuls les champs
+# variables ({label}, {value}...) restent à substituer par str.format.
+_KPI_HTML = (
+    f"""<div style="border:1px solid {C['border']};border-radius:10px;padding:16px 18px;background:{C['subtle']};flex:1;min-width:140px;">"""
+    f"""<div style="font-family:{C['mono']};font-size:10px;font-weight:500;color:{C['text3']};letter-spacing:0.06em;text-transform:uppercase;margin-bottom:6px;">{{label}}</div>"""
+    f"""<div style="font-family:{C['mono']};font-size:22px;font-weight:700;color:{{color}};letter-spacing:-0.02em;">{{value}}</div>"""
+    f"""<div style="font-size:11px;color:{C['text3']};margin-top:3px;">{{sub}}</div>"""
+    "</div>"
+)
+_CARD_TITLE_HTML = f"""<div style="font-size:14px;font-weight:600;color:{C['text']};margin-bottom:8px;">{{title}}</div>"""
+_CARD_HTML = (
+    f"""<div style="border:1px solid {C['border']};border-left:3px solid {{accent}};border-radius:10px;padding:16px 18px;margin-bottom:10px;background:{C['bg']};">"""
+    f"""{{title_html}}<div style="font-size:13px;color:{C['text2']};line-height:1.75;">{{body}}</div>"""
+    "</div>"
+)
+_ACCORDION_HTML = (
+    """<details class="brief-accordion"{open_attr}>"""
+    """<summary><span class="brief-acc-title">{title}</span></summary>"""
+    """<div class="brief-accordion-body">{content}</div>"""
+    "</details>"
+)
+_TAG_HTML = f"""<span style="font-family:{C['mono']};font-size:11px;font-weight:600;color:{{color}};background:{{bg}};padding:2px 8px;border-radius:4px;">{{text}}</span>"""
+_STATUS_HTML = (
+    f"""<div style="border:1px solid {C['border']};border-radius:10px;padding:10px 12px;margin-bottom:12px;background:{C['bg']};">"""
+    f"""<div style="margin-bottom:6px;"><span title="{{detail}}" style="display:inline-flex;align-items:center;border:1px solid {{border}};background:{{bg}};color:{{color}};border-radius:999px;padding:4px 10px;font-family:{C['mono']};font-size:10px;font-weight:600;letter-spacing:0.06em;text-transform:uppercase;">{{label}}</span></div>"""
+    f"""<div style="font-size:12px;color:{C['text2']};line-height:1.6;">{{detail}}</div>"""
+    "</div>"
+)
+_STATUS_PALETTES = {
+    "verified": {"color": C["green"], "bg": C["green_bg"], "border": "rgba(22, 163, 74, 0.32)"},
+    "partial": {"color": C["orange"], "bg": C["orange_bg"], "border": C["orange"]},
+    "insufficient": {"color": C["red"], "bg": C["red_bg"], "border": "rgba(220, 38, 38, 0.32)"},
+}
+
+
 def _kpi(label: str, value: str, sub: str = "", color: str | None = None) -> str:
-    color = color or C["text"]
-    return (
-        f"""<div style="border:1px solid {C['border']};border-radius:10px;padding:16px 18px;background:{C['subtle']};flex:1;min-width:140px;">"""
-        f"""<div style="font-family:{C['mono']};font-size:10px;font-weight:500;color:{C['text3']};letter-spacing:0.06em;text-transform:uppercase;margin-bottom:6px;">{label}</div>"""
-        f"""<div style="font-family:{C['mono']};font-size:22px;font-weight:700;color:{color};letter-spacing:-0.02em;">{value}</div>"""
-        f"""<div style="font-size:11px;color:{C['text3']};margin-top:3px;">{sub}</div>"""
-        "</div>"
-    )
+    return _KPI_HTML.format(label=label, value=value, sub=sub, color=color or C["text"])
 
 
 def _card(title: str, body: str, accent: str | None = None) -> str:
-    accent = accent or C["border"]
-    title_html = (
-        f"""<div style="font-size:14px;font-weight:600;color:{C['text']};margin-bottom:8px;">{title}</div>"""
-        if title
-        else ""
-    )
-    return (
-        f"""<div style="border:1px solid {C['border']};border-left:3px solid {accent};border-radius:10px;padding:16px 18px;margin-bottom:10px;background:{C['bg']};">"""
-        f"""{title_html}<div style="font-size:13px;color:{C['text2']};line-height:1.75;">{body}</div>"""
-        "</div>"
-    )
+    title_html = _CARD_TITLE_HTML.format(title=title) if title else ""
+    return _CARD_HTML.format(accent=accent or C["border"], title_html=title_html, body=body)
 
 
 def _accordion(title: str, content: str, subtitle: str = "", opened: bool = False) -> str:
-    open_attr = " open" if opened else ""
-    return (
-        f"""<details class="brief-accordion"{open_attr}>"""
-        f"""<summary><span class="brief-acc-title">{title}</span></summary>"""
-        f"""<div class="brief-accordion-body">{content}</div>"""
-        "</details>"
-    )
+    return _ACCORDION_HTML.format(open_attr=" open" if opened else "", title=title, content=content)
 
 
 def _tag(text: str, color: str, bg: str) -> str:
-    return f"""<span style="font-family:{C['mono']};font-size:11px;font-weight:600;color:{color};background:{bg};padding:2px 8px;border-radius:4px;">{text}</span>"""
+    return _TAG_HTML.format(text=text, color=color, bg=bg)
 
 
 def _compute_briefing_status(
@@ -118,23 +245,14 @@ def _compute_briefing_status(
 
 
 def _status_block(label: str, detail: str, level: str) -> str:
-    palettes = {
-        "verified": {"color": C["green"], "bg": C["green_bg"], "border": "rgba(22, 163, 74, 0.32)"},
-        "partial": {"color": C["orange"], "bg": C["orange_bg"], "border": C["orange"]},
-        "insufficient": {"color": C["red"], "bg": C["red_bg"], "border": "rgba(220, 38, 38, 0.32)"},
-    }
-    p = palettes.get(level, palettes["partial"])
-    return (
-        f"""<div style="border:1px solid {C['border']};border-radius:10px;padding:10px 12px;margin-bottom:12px;background:{C['bg']};">"""
-        f"""<div style="margin-bottom:6px;"><span title="{detail}" style="display:inline-flex;align-items:center;border:1px solid {p['border']};background:{p['bg']};color:{p['color']};border-radius:999px;padding:4px 10px;font-family:{C['mono']};font-size:10px;font-weight:600;letter-spacing:0.06em;text-transform:uppercase;">{label}</span></div>"""
-        f"""<div style="font-size:12px;color:{C['text2']};line-height:1.6;">{detail}</div>"""
-        "</div>"
-    )
+    return _STATUS_HTML.format(label=label, detail=detail, **_STATUS_PALETTES.get(level, _STATUS_PALETTES["partial"]))
 
 
-def _tone_profile(tone: str) -> dict:
+# Profil figé par ton : le même objet en lecture seule est partagé par tous les blocs du briefing.
+@functools.lru_cache(maxsize=2)
+def _tone_profile(tone: str) -> MappingProxyType:
     if tone == "municipal":
-        return {
+        return MappingProxyType({
             "role_label": "Municipalité",
             "icon": "M",
             "accent": C["orange"],
@@ -144,8 +262,8 @@ def _tone_profile(tone: str) -> dict:
             "finality": "Action terrain",
             "usage": "Arbitrage opérationnel",
             "output": "Priorisation + impact attendu",
-        }
-    return {
+        })
+    return MappingProxyType({
         "role_label": "Grand public",
         "icon": "C",
         "accent": C["blue"],
@@ -155,9 +273,12 @@ def _tone_profile(tone: str) -> dict:
         "finality": "Prévention",
         "usage": "Information citoyenne",
         "output": "Vigilance + gestes concrets",
-    }
+    })
 
 
+# Bandeaux de présentation : ne dépendent que du ton et de la fenêtre. Cache borné : les périodes
+# personnalisées rendent le nombre de libellés illimité.
+@functools.lru_cache(maxsize=32)
 def _role_strip(tone: str, period_label: str) -> str:
     p = _tone_profile(tone)
     return (
@@ -174,6 +295,7 @@ def _role_strip(tone: str, period_label: str) -> str:
     )
 
 
+@functools.lru_cache(maxsize=32)
 def _finality_strip(tone: str) -> str:
     p = _tone_profile(tone)
     items = [
@@ -188,6 +310,7 @@ def _finality_strip(tone: str) -> str:
     return f"""<div style="display:flex;flex-wrap:wrap;gap:6px;margin-bottom:10px;">{chips}</div>"""
 
 
+@functools.lru_cache(maxsize=32)
 def _reading_path_strip(tone: str, period_label: str) -> str:
     if tone == "municipal":
         steps = [
@@ -327,41 +450,62 @@ def _raw_variation(curr: int, prev: int) -> tuple[str, float | None]:
         if curr > 0:
             return f"{delta:+d} / {prev} (base nulle)", None
         return "0 / 0", 0.0
-    pct = (Decimal(delta) / Decimal(int(prev))) * Decimal(100)
-    pct_txt = format(pct, "f")
-    return f"{delta:+d} / {prev} = {pct_txt}%", float(pct)
+    pct = delta / int(prev) * 100.0
+    # 4 décimales au plus, sans zéros inutiles : « 50 », « -12.5 », « 42.8571 ».
+    pct_txt = f"{pct:.4f}".rstrip("0").rstrip(".")
+    return f"{delta:+d} / {prev} = {pct_txt}%", pct
+
+
+# Créneau affiché pour chaque heure entière 0-23 (hors plage : nuit).
+_SLOT_BY_HOUR = (
+    ("22h-7h",) * 6 + ("7h-10h",) * 4 + ("10h-13h",) * 3 + ("13h-16h",) * 3
+    + ("16h-19h",) * 3 + ("19h-22h",) * 3 + ("22h-7h",) * 2
+)
 
 
 def _slot_label(hour: float | int | None) -> str:
     if hour is None or (isinstance(hour, float) and np.isnan(hour)):
         return "la journée"
     h = int(round(float(hour)))
-    if 6 <= h < 10:
-        return "7h-10h"
-    if 10 <= h < 13:
-        return "10h-13h"
-    if 13 <= h < 16:
-        return "13h-16h"
-    if 16 <= h < 19:
-        return "16h-19h"
-    if 19 <= h < 22:
-        return "19h-22h"
-    return "22h-7h"
-
-
-def _mode_num(series: pd.Series) -> float | None:
-    s = pd.to_numeric(series, errors="coerce").dropna()
-    if s.empty:
-        return None
-    return float(s.mode().iloc[0])
+    return _SLOT_BY_HOUR[h] if 0 <= h < 24 else "22h-7h"
 
 
 def _mode_text(series: pd.Series, default: str = "conditions mixtes") -> str:
-    s = series.dropna().astype(str).str.strip()
-    s = s[s != ""]
-    if s.empty:
+    """Libellé le plus fréquent (après strip), ex aequo au premier rencontré, sans tri.
+
+    Seuls les libellés distincts sont nettoyés ; le comptage se fait sur les codes entiers.
+    """
+    codes, uniques = pd.factorize(series)
+    label_codes, labels = pd.factorize(pd.Index(uniques).astype(str).str.strip())
+    counts = np.bincount(label_codes[codes[codes >= 0]], minlength=len(labels))
+    counts[labels == ""] = 0
+    if not counts.any():
         return default
-    return str(s.value_counts().idxmax())
+    return str(labels[counts.argmax()])
+
+
+def _group_mode(keys: pd.Series, values: pd.Series, smallest_on_tie: bool = False) -> pd.Series:
+    """Valeur la plus fréquente par groupe, en un groupby sans callback Python.
+
+    Ex aequo : plus petite valeur (comme Series.mode) ou première rencontrée (comme value_counts).
+    """
+    df = pd.DataFrame({"k": keys.array, "v": values.to_numpy(), "pos": np.arange(len(keys))}).dropna(subset=["v"])
+    stats = df.groupby(["k", "v"], sort=False, observed=True)["pos"].agg(["size", "min"]).reset_index()
+    tie = "v" if smallest_on_tie else "min"
+    stats = stats.sort_values(["k", "size", tie], ascending=[True, False, True], kind="stable")
+    return stats.drop_duplicates("k").set_index("k")["v"]
+
+
+def _hotspot_311_mask(req311: pd.DataFrame) -> np.ndarray:
+    """Requêtes 311 liées aux hotspots (nids-de-poule, déneigement, éclairage).
+
+    Le motif n'est testé qu'une fois par type de service distinct ; les valeurs manquantes sont exclues.
+    """
+    if "type_service" not in req311.columns:
+        return np.zeros(len(req311), dtype=bool)
+    codes, uniques = pd.factorize(req311["type_service"])
+    hits = np.fromiter((HOTSPOT_311_RE.search(str(u)) is not None for u in uniques), dtype=bool, count=len(uniques))
+    return np.append(hits, False)[codes]
 
 
 def _prepare_frames(data: dict) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.Timestamp]:
@@ -371,6 +515,7 @@ def _prepare_frames(data: dict) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFram
 
     collisions["_dt"] = pd.to_datetime(collisions.get("date"), errors="coerce")
     req311["_dt"] = pd.to_datetime(req311.get("date"), errors="coerce")
+    req311["_hotspot_311"] = _hotspot_311_mask(req311)
 
     anchors = [collisions["_dt"].max(), req311["_dt"].max()]
     anchor = max([a for a in anchors if pd.notna(a)], default=pd.Timestamp(datetime.now()))
@@ -379,11 +524,7 @@ def _prepare_frames(data: dict) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFram
 
 
 def _period_days(periode: str) -> int:
-    m = re.search(
-        r"Personnalisée\s*:\s*(\d{4}-\d{2}-\d{2})\s*(?:->|→)\s*(\d{4}-\d{2}-\d{2})",
-        str(periode),
-        flags=re.IGNORECASE,
-    )
+    m = PERIOD_CUSTOM_RE.search(str(periode))
     if m:
         start = pd.to_datetime(m.group(1), errors="coerce")
         end = pd.to_datetime(m.group(2), errors="coerce")
@@ -394,6 +535,15 @@ def _period_days(periode: str) -> int:
     return PERIOD_TO_DAYS.get(periode, 30)
 
 
+def _in_window(dt: pd.Series, start: pd.Timestamp, end: pd.Timestamp) -> np.ndarray:
+    """start <= dt <= end en une seule comparaison non signée sur les ns (NaT et hors bornes débordent).
+
+    Les lignes gardent leur ordre d'origine : les ex aequo des agrégats en aval n'en dépendent pas.
+    """
+    ns = dt.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return (ns - np.int64(start.value)).view(np.uint64) <= np.uint64(end.value - start.value)
+
+
 def _slice_period(curr_df: pd.DataFrame, ref_df: pd.DataFrame, days: int):
     anchor_candidates = []
     if not curr_df.empty:
@@ -406,8 +556,9 @@ def _slice_period(curr_df: pd.DataFrame, ref_df: pd.DataFrame, days: int):
     prev_start = anchor - pd.Timedelta(days=2 * days - 1)
     prev_end = anchor - pd.Timedelta(days=days)
 
-    curr = curr_df[(curr_df["_dt"] >= curr_start) & (curr_df["_dt"] <= anchor)].copy()
-    prev = ref_df[(ref_df["_dt"] >= prev_start) & (ref_df["_dt"] <= prev_end)].copy()
+    # Copy-on-write (pandas 3) : le masque booléen rend déjà un nouveau frame, pas besoin de .copy().
+    curr = curr_df[_in_window(curr_df["_dt"], curr_start, anchor)]
+    prev = ref_df[_in_window(ref_df["_dt"], prev_start, prev_end)]
     return curr, prev, curr_start, anchor
 
 
@@ -423,24 +574,46 @@ def _period_windows(
     return coll_curr, coll_prev, req_curr, req_prev, coll_start, coll_anchor, req_start, req_anchor
 
 
+ZONE_LAT_STEP = 0.004
+ZONE_LON_STEP = 0.005
+
+
+def _zone_keys(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Coordonnées arrondies à la maille (~300 m), calculées sur les tableaux NumPy bruts.
+
+    np.rint arrondit comme Series.round : les clés restent identiques entre collisions et arrêts.
+    """
+    lat = df["latitude"].to_numpy(dtype=np.float64)
+    lon = df["longitude"].to_numpy(dtype=np.float64)
+    return np.rint(lat / ZONE_LAT_STEP) * ZONE_LAT_STEP, np.rint(lon / ZONE_LON_STEP) * ZONE_LON_STEP
+
+
 def _build_hotspots(coll_curr: pd.DataFrame, req_curr: pd.DataFrame, stm: pd.DataFrame, days: int) -> list[dict]:
     candidates: list[dict] = []
 
     if not coll_curr.empty:
-        coll = coll_curr.copy()
-        coll["intersection"] = coll.get("intersection", "Secteur inconnu").fillna("Secteur inconnu").astype(str)
-        coll["condition_meteo"] = coll.get("condition_meteo", "Inconnue").fillna("Inconnue").astype(str)
-
-        by_inter = (
-            coll.groupby("intersection")
-            .agg(
-                collisions=("gravite_num", "count"),
-                graves=("gravite_num", lambda x: int((x >= 3).sum())),
-                heure_mode=("heure", _mode_num),
-                meteo_mode=("condition_meteo", _mode_text),
-            )
-            .sort_values("collisions", ascending=False)
+        # assign() ajoute les colonnes sans recopier le frame source (copy-on-write).
+        # Intersection en catégorie : un seul hachage des libellés, puis trois groupby sur les codes
+        # (catégories triées : même ordre de groupes qu'en object).
+        coll = coll_curr.assign(
+            intersection=coll_curr.get("intersection", "Secteur inconnu")
+            .fillna("Secteur inconnu")
+            .astype(str)
+            .astype("category"),
+            condition_meteo=coll_curr.get("condition_meteo", "Inconnue").fillna("Inconnue").astype(str),
+            _grave=(coll_curr["gravite_num"] >= 3).astype(np.int64),
         )
+        by_inter = coll.groupby("intersection", observed=True).agg(collisions=("gravite_num", "count"), graves=("_grave", "sum"))
+        meteo = coll["condition_meteo"].str.strip()
+        by_inter["heure_mode"] = _group_mode(
+            coll["intersection"], pd.to_numeric(coll["heure"], errors="coerce").astype(float), smallest_on_tie=True
+        ).reindex(by_inter.index)
+        by_inter["meteo_mode"] = (
+            _group_mode(coll["intersection"], meteo.where(meteo != ""))
+            .reindex(by_inter.index)
+            .fillna("conditions mixtes")
+        )
+        by_inter = by_inter.sort_values("collisions", ascending=False)
 
         for intersection, row in by_inter.head(5).iterrows():
             slot = _slot_label(row["heure_mode"])
@@ -469,10 +642,11 @@ def _build_hotspots(coll_curr: pd.DataFrame, req_curr: pd.DataFrame, stm: pd.Dat
             )
 
     if not req_curr.empty:
-        req = req_curr.copy()
-        req["type_service"] = req.get("type_service", "Non specifie").fillna("Non specifie").astype(str)
-        req["quartier"] = req.get("quartier", "Montreal").fillna("Montreal").astype(str)
-        req_focus = req[req["type_service"].str.contains(HOTSPOT_311_REGEX, case=False, na=False, regex=True)]
+        req = req_curr.assign(
+            type_service=req_curr.get("type_service", "Non specifie").fillna("Non specifie").astype(str),
+            quartier=req_curr.get("quartier", "Montreal").fillna("Montreal").astype(str),
+        )
+        req_focus = req[req["_hotspot_311"]]
         if req_focus.empty:
             req_focus = req
 
@@ -507,22 +681,31 @@ def _build_hotspots(coll_curr: pd.DataFrame, req_curr: pd.DataFrame, stm: pd.Dat
             )
 
     if not coll_curr.empty and not stm.empty:
-        coll = coll_curr.copy()
-        coll["lat_zone"] = (coll["latitude"] / 0.004).round() * 0.004
-        coll["lon_zone"] = (coll["longitude"] / 0.005).round() * 0.005
-
-        stm_z = stm.copy()
-        stm_z["lat_zone"] = (stm_z["latitude"] / 0.004).round() * 0.004
-        stm_z["lon_zone"] = (stm_z["longitude"] / 0.005).round() * 0.005
-
+        lat_zone, lon_zone = _zone_keys(stm)
+        stm_z = stm.assign(lat_zone=lat_zone, lon_zone=lon_zone)
+        stm_zones = pd.MultiIndex.from_arrays([lat_zone, lon_zone]).unique()
+
+        # Seules les zones avec un arrêt survivent à la jointure interne : on filtre avant le groupby.
+        lat_zone, lon_zone = _zone_keys(coll_curr)
+        near_stop = pd.MultiIndex.from_arrays([lat_zone, lon_zone]).isin(stm_zones)
+        coll = coll_curr[near_stop].assign(
+            lat_zone=lat_zone[near_stop],
+            lon_zone=lon_zone[near_stop],
+            _grave=(coll_curr["gravite_num"].to_numpy()[near_stop] >= 3).astype(np.int64),
+        )
         by_zone = (
             coll.groupby(["lat_zone", "lon_zone"])
-            .agg(total=("gravite_num", "count"), graves=("gravite_num", lambda x: int((x >= 3).sum())))
+            .agg(total=("gravite_num", "count"), graves=("_grave", "sum"))
             .reset_index()
         )
+        # Deux premiers noms d'arrêt par zone ; une zone sans nom garde une chaîne vide.
+        named = stm_z.dropna(subset=["stop_name"]).astype({"stop_name": str})
+        stop_names = named.groupby(["lat_zone", "lon_zone"]).head(2).groupby(["lat_zone", "lon_zone"])["stop_name"].agg(", ".join)
         stops = (
-            stm_z.groupby(["lat_zone", "lon_zone"])
-            .agg(stop_name=("stop_name", lambda x: ", ".join(pd.Series(x).dropna().astype(str).head(2))))
+            stm_z.groupby(["lat_zone", "lon_zone"]).size().to_frame("n")
+            .join(stop_names)
+            .fillna({"stop_name": ""})
+            .drop(columns="n")
             .reset_index()
         )
         merged = by_zone.merge(stops, on=["lat_zone", "lon_zone"], how="inner").sort_values("total", ascending=False).head(3)
@@ -561,8 +744,10 @@ def _build_hotspots(coll_curr: pd.DataFrame, req_curr: pd.DataFrame, stm: pd.Dat
             "graves": 0,
         }]
 
+    # Un seul tri (stable) sert aux quotas par source et au complément.
+    ranked = sorted(candidates, key=lambda x: x["score"], reverse=True)
     by_source = {"Collisions": [], "311": [], "STM": []}
-    for c in sorted(candidates, key=lambda x: x["score"], reverse=True):
+    for c in ranked:
         by_source.setdefault(c["source"], []).append(c)
 
     selected: list[dict] = []
@@ -572,7 +757,7 @@ def _build_hotspots(coll_curr: pd.DataFrame, req_curr: pd.DataFrame, stm: pd.Dat
 
     if len(selected) < 5:
         selected_ids = {id(x) for x in selected}
-        leftovers = [c for c in sorted(candidates, key=lambda x: x["score"], reverse=True) if id(c) not in selected_ids]
+        leftovers = [c for c in ranked if id(c) not in selected_ids]
         selected.extend(leftovers[: 5 - len(selected)])
 
     return selected[:5]
@@ -598,8 +783,8 @@ def _build_trends(
     graves_prev = int((coll_prev.get("gravite_num", pd.Series(dtype=float)) >= 3).sum()) if not coll_prev.empty else 0
     graves_var = _safe_pct(graves_curr, graves_prev)
 
-    req_curr_focus = req_curr[req_curr.get("type_service", pd.Series(dtype=str)).astype(str).str.contains(HOTSPOT_311_REGEX, case=False, na=False, regex=True)]
-    req_prev_focus = req_prev[req_prev.get("type_service", pd.Series(dtype=str)).astype(str).str.contains(HOTSPOT_311_REGEX, case=False, na=False, regex=True)]
+    req_curr_focus = req_curr[req_curr["_hotspot_311"]]
+    req_prev_focus = req_prev[req_prev["_hotspot_311"]]
     req_curr_n = len(req_curr_focus)
     req_prev_n = len(req_prev_focus)
     req_var = _safe_pct(req_curr_n, req_prev_n)
@@ -888,8 +1073,8 @@ def generate_briefing(
     var_color = C["red"] if coll_var > 0 else C["green"] if coll_var < 0 else C["blue"]
     var_bg = C["red_bg"] if coll_var > 0 else C["green_bg"] if coll_var < 0 else C["blue_bg"]
 
-    req_focus_curr = req_curr[req_curr.get("type_service", pd.Series(dtype=str)).astype(str).str.contains(HOTSPOT_311_REGEX, case=False, na=False, regex=True)]
-    req_focus_prev = req_prev[req_prev.get("type_service", pd.Series(dtype=str)).astype(str).str.contains(HOTSPOT_311_REGEX, case=False, na=False, regex=True)]
+    req_focus_curr = req_curr[req_curr["_hotspot_311"]]
+    req_focus_prev = req_prev[req_prev["_hotspot_311"]]
     req_curr_total_n = len(req_curr)
     req_focus_curr_n = len(req_focus_curr)
     req_var = _safe_pct(req_focus_curr_n, len(req_focus_prev))
@@ -1218,102 +1403,5 @@ def generate_briefing(
             + _accordion(sources_title_acc, footer, subtitle=sources_subtitle_acc, opened=False)
         )
 
-    layout_css = f"""
-<style>
-.brief-accordion {{
-  border:1px solid {C['border']};
-  border-radius:12px;
-  background:{C['bg']};
-  margin:0 0 14px 0;
-  overflow:hidden;
-}}
-.brief-accordion > summary {{
-  list-style:none;
-  cursor:pointer;
-  display:flex;
-  align-items:center;
-  justify-content:space-between;
-  gap:10px;
-  padding:11px 14px;
-  background:{C['bg']};
-  border-bottom:1px solid transparent;
-  transition:background 160ms ease, border-color 160ms ease;
-}}
-.brief-accordion > summary::-webkit-details-marker {{
-  display:none;
-}}
-.brief-accordion > summary::after {{
-  content:"+";
-  font-family:{C['mono']};
-  font-size:14px;
-  color:{C['text3']};
-  line-height:1;
-}}
-.brief-accordion[open] > summary {{
-  border-bottom-color:{C['border']};
-  background:{C['subtle']};
-}}
-.brief-accordion[open] > summary::after {{
-  content:"−";
-  color:{C['text2']};
-}}
-.brief-acc-title {{
-  font-family:{C['mono']};
-  font-size:11px;
-  font-weight:600;
-  color:{C['text2']};
-  letter-spacing:0.08em;
-  text-transform:uppercase;
-}}
-.brief-accordion-body {{
-  padding:14px 14px 12px 14px;
-  background:{C['bg']};
-}}
-.brief-top-grid {{
-  display:grid;
-  grid-template-columns: minmax(0, 1.6fr) minmax(0, 1fr);
-  gap:12px;
-  align-items:start;
-}}
-.brief-bottom-grid {{
-  display:grid;
-  grid-template-columns: repeat(2, minmax(0, 1fr));
-  gap:12px;
-  align-items:start;
-}}
-.brief-zone-grid {{
-  display:grid;
-  grid-template-columns: repeat(2, minmax(0, 1fr));
-  gap:10px;
-}}
-.brief-reco-grid {{
-  display:grid;
-  grid-template-columns: repeat(2, minmax(0, 1fr));
-  gap:10px;
-}}
-.brief-decision-grid {{
-  display:grid;
-  grid-template-columns: repeat(2, minmax(0, 1fr));
-  gap:10px;
-}}
-@media (max-width: 980px) {{
-  .brief-top-grid,
-  .brief-bottom-grid,
-  .brief-zone-grid,
-  .brief-reco-grid,
-  .brief-decision-grid {{
-    grid-template-columns: 1fr !important;
-  }}
-  .brief-accordion > summary {{
-    flex-direction:column;
-    align-items:flex-start;
-  }}
-  .brief-zone-grid > div {{
-    grid-column: auto !important;
-  }}
-}}
-</style>
-"""
-
     decision_top_html = f"""<div style="margin:2px 0 12px 0;">{decision_sec}</div>"""
-    return f"""<div style="font-family:{C['sans']};background:{C['bg']};border:1px solid {C['border']};border-radius:16px;padding:14px 14px 12px 14px;overflow:hidden;">{layout_css}{header}{insight_html}{status_html}{kpis}{decision_top_html}{zero_note_html}{body_sections}</div>"""
+    return f"""<div style="font-family:{C['sans']};background:{C['bg']};border:1px solid {C['border']};border-radius:16px;padding:14px 14px 12px 14px;overflow:hidden;">{LAYOUT_CSS}{header}{insight_html}{status_html}{kpis}{decision_top_html}{zero_note_html}{body_sections}</div>"""
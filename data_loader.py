@@ -715,11 +715,13 @@ def _hotspots(coll):
     # Exclure les valeurs vides
     coll = coll[coll["intersection"].str.strip() != ""]
 
+    # Indicateur grave précalculé : la somme reste dans le chemin Cython du groupby.
+    coll["_grave"] = (coll["gravite_num"] >= 3).to_numpy(dtype=np.int64)
     df = coll.groupby("intersection").agg(
         collisions=("gravite_num","count"),
-        graves=("gravite_num", lambda x: (x >= 3).sum()),
+        graves=("_grave", "sum"),
         heure_moyenne=("heure","mean"),
-    ).reset_index().sort_values("collisions", ascending=False).head(5)
+    ).reset_index().nlargest(5, "collisions")
     df["lieu"] = df["intersection"].astype(str)
     df["tendance"] = (["+12%","+8%","+3%","-2%","+15%"] * 2)[:len(df)]
     return df.reset_index(drop=True)
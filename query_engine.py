@@ -4,6 +4,7 @@ Moteur d'analyse : génère des requêtes pandas, les exécute réellement sur l
 et formate des réponses avec RAG + mode contradicteur.
 """
 
+import functools
 import html
 import re
 import unicodedata
@@ -12,6 +13,108 @@ import numpy as np
 from rag_engine import RAGEngine
 from llm_client import LLMClient
 
+# Couleurs inline fixes -> variables CSS thématiques, appliquées en une seule passe regex.
+THEME_COLOR_VARS = {
+    "ffffff": "var(--mc-card-bg)",
+    "fff": "var(--mc-card-bg)",
+    "f8fafc": "var(--mc-surface)",
+    "fafafa": "var(--mc-surface)",
+    "f7fbff": "var(--mc-surface)",
+    "eff6ff": "var(--mc-surface)",
+    "f0f6ff": "var(--mc-surface)",
+    "ebf3fe": "var(--mc-surface)",
+    "fff7ed": "var(--mc-warn-bg)",
+    "e5e7eb": "var(--mc-border)",
+    "e5e5e5": "var(--mc-border)",
+    "eceff3": "var(--mc-border)",
+    "d4e2f4": "var(--mc-border)",
+    "d4d4d8": "var(--mc-border)",
+    "fed7aa": "var(--mc-warn-border)",
+    "ea580c33": "var(--mc-warn-soft)",
+    "111827": "var(--mc-text)",
+    "404040": "var(--mc-text)",
+    "374151": "var(--mc-text)",
+    "334155": "var(--mc-text)",
+    "0a0a0a": "var(--mc-text)",
+    "6b7280": "var(--mc-text-muted)",
+    "9ca3af": "var(--mc-text-muted)",
+    "a3a3a3": "var(--mc-text-muted)",
+    "2563eb": "var(--mc-accent)",
+    "dc2626": "var(--mc-danger)",
+    "16a34a": "var(--mc-success)",
+    "ea580c": "var(--mc-warn)",
+}
+HEX_COLOR_RE = re.compile(r"#([0-9a-fA-F]{3,8})\b")
+
+
+# Routage purement lexical : mémoïsé au niveau du module (l'app puis answer() routent la même
+# question), sans retenir d'instance QueryEngine ni ses données dans le cache.
+@functools.lru_cache(maxsize=2048)
+def _route_question(question: str) -> str:
+    """Identifie le type d'analyse à effectuer."""
+    if QueryEngine._is_smalltalk(question):
+        return "smalltalk"
+    if not QueryEngine._has_mobility_context(question):
+        return "off_topic"
+    if not QueryEngine._has_analytic_intent(question):
+        return "need_clarification"
+
+    q = (question or "").lower()
+    q_norm = unicodedata.normalize("NFKD", q)
+    q_norm = "".join(ch for ch in q_norm if not unicodedata.combining(ch))
+    variants = (q, q_norm)
+
+    def has_any(tokens: list[str]) -> bool:
+        return any(tok in text for text in variants for tok in tokens)
+
+    has_311 = has_any(["311", "requete", "requetes", "signalement", "nid", "deneig", "eclair"])
+    has_weather = has_any(
+        [
+            "pluie", "pleu", "averse", "mouill",
+            "neige", "enneig",
+            "verglas", "glace", "gel",
+            "meteo", "temperature", "conditions", "froid",
+            "rain", "wet", "snow", "ice", "weather",
+        ]
+    )
+    has_collision = has_any(["collision", "accident", "incident", "carambol", "crash"])
+    asks_type = has_any(["type", "types", "categorie", "explos", "hausse", "augment", "increase", "spike"])
+    trend_words = has_any(["hausse", "augment", "baisse", "evolution", "tendance", "variation", "trend"])
+    street_terms = has_any(
+        ["rue", "intersection", "boulevard", "boul", "avenue", "route", "autoroute", "axe", "carrefour", "street", "road"]
+    )
+    area_terms = has_any(["quartier", "secteur", "arrondissement", "zone", "district", "borough", "neighborhood", "neighbourhood"])
+    stm_terms = has_any(["stm", "bus", "arret", "ligne", "metro", "station"])
+    risk_words = has_any(["dangereux", "dangereuse", "danger", "risque", "prioritaire", "critique", "top", "plus", "most"])
+    now_words = has_any(["en ce moment", "actuellement", "maintenant", "right now", "currently"])
+
+    if has_311 and (has_weather or asks_type):
+        return "311_types_weather"
+    if now_words and (has_collision or has_311):
+        return "trend_incidents"
+    if trend_words and (has_collision or has_311):
+        return "trend_incidents"
+    # Cas clé: "quelle rue/intersection est la plus dangereuse avec pluie/neige..."
+    if has_weather and street_terms and (has_collision or risk_words):
+        return "hotspots_meteo"
+    if has_311:
+        return "311_temperature"
+    elif stm_terms:
+        return "stm"
+    elif area_terms and has_weather:
+        return "quartiers_meteo"
+    elif area_terms:
+        return "quartiers"
+    elif has_weather:
+        return "meteo_collision"
+    elif has_any(["coince", "embouteill", "trafic", "congestion", "bouchon"]):
+        return "hotspots"
+    elif has_any(["hotspot", "dangereux", "danger", "accident", "collision"]):
+        return "hotspots"
+    else:
+        return "hotspots"  # défaut
+
+
 
 class QueryEngine:
     def __init__(self, data: dict):
@@ -138,7 +241,8 @@ class QueryEngine:
             return "req311"
         return "collisions"
 
-    def _is_smalltalk(self, question: str) -> bool:
+    @staticmethod
+    def _is_smalltalk(question: str) -> bool:
         q = (question or "").strip().lower()
         if not q:
             return True
@@ -154,7 +258,8 @@ class QueryEngine:
             return True
         return any(q.startswith(tok + " ") for tok in smalltalk_tokens)
 
-    def _has_mobility_context(self, question: str) -> bool:
+    @staticmethod
+    def _has_mobility_context(question: str) -> bool:
         q = (question or "").strip().lower()
         q_norm = unicodedata.normalize("NFKD", q)
         q_norm = "".join(ch for ch in q_norm if not unicodedata.combining(ch))
@@ -178,7 +283,8 @@ class QueryEngine:
                 return True
         return False
 
-    def _has_analytic_intent(self, question: str) -> bool:
+    @staticmethod
+    def _has_analytic_intent(question: str) -> bool:
         q = (question or "").strip().lower()
         intent_tokens = [
             "combien", "quel", "quels", "quelle", "quelles", "où", "ou ", "top",
@@ -344,24 +450,10 @@ Ajoutez une intention claire (top, évolution, comparaison, période, zone), pui
         """Remplace les couleurs inline fixes par des variables CSS thématiques."""
         if not isinstance(html_content, str) or not html_content:
             return html_content
-        replacements = [
-            (r"#ffffff\b|#fff\b", "var(--mc-card-bg)"),
-            (r"#f8fafc\b|#fafafa\b|#f7fbff\b|#eff6ff\b|#f0f6ff\b|#ebf3fe\b", "var(--mc-surface)"),
-            (r"#fff7ed\b", "var(--mc-warn-bg)"),
-            (r"#e5e7eb\b|#e5e5e5\b|#eceff3\b|#d4e2f4\b|#d4d4d8\b", "var(--mc-border)"),
-            (r"#fed7aa\b", "var(--mc-warn-border)"),
-            (r"#ea580c33\b", "var(--mc-warn-soft)"),
-            (r"#111827\b|#404040\b|#374151\b|#334155\b|#0a0a0a\b", "var(--mc-text)"),
-            (r"#6b7280\b|#9ca3af\b|#a3a3a3\b", "var(--mc-text-muted)"),
-            (r"#2563eb\b", "var(--mc-accent)"),
-            (r"#dc2626\b", "var(--mc-danger)"),
-            (r"#16a34a\b", "var(--mc-success)"),
-            (r"#ea580c\b", "var(--mc-warn)"),
-        ]
-        out = html_content
-        for pattern, dst in replacements:
-            out = re.sub(pattern, dst, out, flags=re.IGNORECASE)
-        return out
+        return HEX_COLOR_RE.sub(
+            lambda m: THEME_COLOR_VARS.get(m.group(1).lower(), m.group(0)),
+            html_content,
+        )
 
     @staticmethod
     def _is_empty_result(result) -> bool:
@@ -1035,67 +1127,7 @@ Ajoutez une intention claire (top, évolution, comparaison, période, zone), pui
     
     def route_question(self, question: str) -> str:
         """Identifie le type d'analyse à effectuer."""
-        if self._is_smalltalk(question):
-            return "smalltalk"
-        if not self._has_mobility_context(question):
-            return "off_topic"
-        if not self._has_analytic_intent(question):
-            return "need_clarification"
-
-        q = (question or "").lower()
-        q_norm = unicodedata.normalize("NFKD", q)
-        q_norm = "".join(ch for ch in q_norm if not unicodedata.combining(ch))
-        variants = (q, q_norm)
-
-        def has_any(tokens: list[str]) -> bool:
-            return any(tok in text for text in variants for tok in tokens)
-
-        has_311 = has_any(["311", "requete", "requetes", "signalement", "nid", "deneig", "eclair"])
-        has_weather = has_any(
-            [
-                "pluie", "pleu", "averse", "mouill",
-                "neige", "enneig",
-                "verglas", "glace", "gel",
-                "meteo", "temperature", "conditions", "froid",
-                "rain", "wet", "snow", "ice", "weather",
-            ]
-        )
-        has_collision = has_any(["collision", "accident", "incident", "carambol", "crash"])
-        asks_type = has_any(["type", "types", "categorie", "explos", "hausse", "augment", "increase", "spike"])
-        trend_words = has_any(["hausse", "augment", "baisse", "evolution", "tendance", "variation", "trend"])
-        street_terms = has_any(
-            ["rue", "intersection", "boulevard", "boul", "avenue", "route", "autoroute", "axe", "carrefour", "street", "road"]
-        )
-        area_terms = has_any(["quartier", "secteur", "arrondissement", "zone", "district", "borough", "neighborhood", "neighbourhood"])
-        stm_terms = has_any(["stm", "bus", "arret", "ligne", "metro", "station"])
-        risk_words = has_any(["dangereux", "dangereuse", "danger", "risque", "prioritaire", "critique", "top", "plus", "most"])
-        now_words = has_any(["en ce moment", "actuellement", "maintenant", "right now", "currently"])
-
-        if has_311 and (has_weather or asks_type):
-            return "311_types_weather"
-        if now_words and (has_collision or has_311):
-            return "trend_incidents"
-        if trend_words and (has_collision or has_311):
-            return "trend_incidents"
-        # Cas clé: "quelle rue/intersection est la plus dangereuse avec pluie/neige..."
-        if has_weather and street_terms and (has_collision or risk_words):
-            return "hotspots_meteo"
-        if has_311:
-            return "311_temperature"
-        elif stm_terms:
-            return "stm"
-        elif area_terms and has_weather:
-            return "quartiers_meteo"
-        elif area_terms:
-            return "quartiers"
-        elif has_weather:
-            return "meteo_collision"
-        elif has_any(["coince", "embouteill", "trafic", "congestion", "bouchon"]):
-            return "hotspots"
-        elif has_any(["hotspot", "dangereux", "danger", "accident", "collision"]):
-            return "hotspots"
-        else:
-            return "hotspots"  # défaut
+        return _route_question(question)
 
     def _lead_text(self, analysis_type: str, result, periode: str) -> str:
         """Petit texte d'introduction lisible avant les détails chiffrés."""
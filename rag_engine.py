@@ -4,6 +4,7 @@ Moteur RAG léger basé sur un corpus de connaissances statique.
 Simule ChromaDB/LlamaIndex pour la démo — structure prête pour intégration réelle.
 """
 
+import functools
 import re
 import unicodedata
 
@@ -80,6 +81,78 @@ CORPUS = {
 }
 
 
+# ─── AMBIGUÏTÉS ───────────────────────────────────────────────────────────────
+# Mots déclencheurs d'ambiguïté
+AMBIGUOUS_PATTERNS = {
+    "ça coince": {
+        "reason": "L'expression 'ça coince' peut désigner plusieurs phénomènes.",
+        "clarifications": [
+            "🚗 Embouteillages / ralentissements de trafic",
+            "⚠️ Zones à fort taux de collisions",
+            "📋 Secteurs avec beaucoup de requêtes 311 non résolues",
+        ]
+    },
+    "ça bloque": {
+        "reason": "L'expression 'ça bloque' peut désigner plusieurs phénomènes.",
+        "clarifications": [
+            "🚗 Embouteillages / ralentissements de trafic",
+            "⚠️ Zones à fort taux de collisions",
+            "📋 Secteurs avec beaucoup de requêtes 311 non résolues",
+        ]
+    },
+    "incidents": {
+        "reason": "Le terme 'incidents' peut couvrir différents types de données.",
+        "clarifications": [
+            "💥 Collisions routières (base de données accidents)",
+            "📋 Requêtes 311 (problèmes signalés par citoyens)",
+            "🚌 Perturbations du réseau STM",
+        ]
+    },
+    "problèmes": {
+        "reason": "Plusieurs types de problèmes sont disponibles dans les données.",
+        "clarifications": [
+            "🛣️ Problèmes de voirie (nids-de-poule, trottoirs)",
+            "🚨 Problèmes de sécurité (collisions, zones dangereuses)",
+            "💡 Problèmes d'infrastructure (éclairage, aqueduc)",
+        ]
+    },
+}
+
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+# Motifs normalisés une fois au chargement, plutôt qu'à chaque question.
+_AMBIGUOUS_PATTERNS_NORM = tuple(
+    (pattern, _strip_accents(pattern.lower()), info)
+    for pattern, info in AMBIGUOUS_PATTERNS.items()
+)
+CA_COINCE_RE = re.compile(r"\b(ca|ça)\s+(coince|bloque)\b")
+OU_CA_COINCE_RE = re.compile(r"\bou\s+ca\s+(coince|bloque)\b")
+
+
+# Mémoïsé : la même question est testée par l'app puis par QueryEngine.answer.
+@functools.lru_cache(maxsize=2048)
+def _match_ambiguous_pattern(question: str) -> str | None:
+    """Clé de AMBIGUOUS_PATTERNS déclenchée par la question, ou None."""
+    question_lower = question.lower()
+    question_norm = _strip_accents(question_lower)
+
+    for pattern, pattern_norm, _ in _AMBIGUOUS_PATTERNS_NORM:
+        if pattern in question_lower or pattern_norm in question_norm:
+            return pattern
+
+    # Variantes fréquentes non accentuées.
+    if (
+        CA_COINCE_RE.search(question_lower)
+        or OU_CA_COINCE_RE.search(question_norm)
+    ):
+        return "ça coince"
+    return None
+
+
 class RAGEngine:
     """
     Moteur RAG léger.
@@ -169,66 +242,12 @@ class RAGEngine:
         Détecte si une question est ambiguë.
         Retourne {'is_ambiguous': bool, 'reason': str, 'clarifications': list}
         """
-        question_lower = (question or "").lower()
-        question_norm = unicodedata.normalize("NFKD", question_lower)
-        question_norm = "".join(ch for ch in question_norm if not unicodedata.combining(ch))
-        
-        # Mots déclencheurs d'ambiguïté
-        ambiguous_patterns = {
-            "ça coince": {
-                "reason": "L'expression 'ça coince' peut désigner plusieurs phénomènes.",
-                "clarifications": [
-                    "🚗 Embouteillages / ralentissements de trafic",
-                    "⚠️ Zones à fort taux de collisions",
-                    "📋 Secteurs avec beaucoup de requêtes 311 non résolues",
-                ]
-            },
-            "ça bloque": {
-                "reason": "L'expression 'ça bloque' peut désigner plusieurs phénomènes.",
-                "clarifications": [
-                    "🚗 Embouteillages / ralentissements de trafic",
-                    "⚠️ Zones à fort taux de collisions",
-                    "📋 Secteurs avec beaucoup de requêtes 311 non résolues",
-                ]
-            },
-            "incidents": {
-                "reason": "Le terme 'incidents' peut couvrir différents types de données.",
-                "clarifications": [
-                    "💥 Collisions routières (base de données accidents)",
-                    "📋 Requêtes 311 (problèmes signalés par citoyens)",
-                    "🚌 Perturbations du réseau STM",
-                ]
-            },
-            "problèmes": {
-                "reason": "Plusieurs types de problèmes sont disponibles dans les données.",
-                "clarifications": [
-                    "🛣️ Problèmes de voirie (nids-de-poule, trottoirs)",
-                    "🚨 Problèmes de sécurité (collisions, zones dangereuses)",
-                    "💡 Problèmes d'infrastructure (éclairage, aqueduc)",
-                ]
-            },
+        pattern = _match_ambiguous_pattern(question or "")
+        if pattern is None:
+            return {"is_ambiguous": False}
+        info = AMBIGUOUS_PATTERNS[pattern]
+        return {
+            "is_ambiguous": True,
+            "reason": info["reason"],
+            "clarifications": list(info["clarifications"]),
         }
-        
-        for pattern, info in ambiguous_patterns.items():
-            pattern_norm = unicodedata.normalize("NFKD", pattern.lower())
-            pattern_norm = "".join(ch for ch in pattern_norm if not unicodedata.combining(ch))
-            if pattern in question_lower or pattern_norm in question_norm:
-                return {
-                    "is_ambiguous": True,
-                    "reason": info["reason"],
-                    "clarifications": info["clarifications"]
-                }
-
-        # Variantes fréquentes non accentuées.
-        if (
-            re.search(r"\b(ca|ça)\s+(coince|bloque)\b", question_lower)
-            or re.search(r"\bou\s+ca\s+(coince|bloque)\b", question_norm)
-        ):
-            info = ambiguous_patterns["ça coince"]
-            return {
-                "is_ambiguous": True,
-                "reason": info["reason"],
-                "clarifications": info["clarifications"],
-            }
-        
-        return {"is_ambiguous": False}